@@ -0,0 +1,203 @@
+# Created and maintained by: Minedient
+# GPL-3.0 License
+
+# Headless benchmark: replays recorded frames through the detection pipeline and reports the figures as JSON
+#
+#   python benchmark.py clip.mp4 --model yolo11n.pt --imgsz 320 --output report.json
+#
+# The rule, zones and options come from config.ini like in the window, without a camera or a micro:bit.
+
+import sys, os
+import argparse
+import json
+import logging
+import time
+
+import cv2
+import psutil
+
+import engine
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+BAUDRATE = 115200 # Speed of the emulated serial line
+
+class ImageDirectory:
+    """
+    The images of a directory in name order, read like the frames of a cv2.VideoCapture.
+    """
+    def __init__(self, path):
+        self.files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(IMAGE_SUFFIXES))
+        self.index = 0
+
+    def isOpened(self):
+        return bool(self.files)
+
+    def read(self):
+        while self.index < len(self.files):
+            frame = cv2.imread(self.files[self.index])
+            self.index += 1
+            if frame is not None:
+                return True, frame
+        return False, None
+
+    def release(self):
+        self.files = []
+
+class ReplaySource:
+    """
+    Recorded frame source, a video file or a directory of images, with the interface of FrameGrabber.
+
+    The frames are read on demand instead of in a capture thread, so no frame is dropped and
+    every run replays exactly the same frames. `exhausted` is set once the frames run out.
+    """
+    def __init__(self, path, max_frames=0):
+        self.cap = ImageDirectory(path) if os.path.isdir(path) else cv2.VideoCapture(path)
+        self.max_frames = max_frames
+        self.processed = 0
+        self.dropped = 0
+        self.allocations = 0
+        self.captured_at = 0.0
+        self.exhausted = False
+
+    def start(self):
+        pass
+
+    def read(self, timeout=None):
+        ret, frame = self.cap.read() if not self.max_frames or self.processed < self.max_frames else (False, None)
+        if not ret:
+            self.exhausted = True
+            return False, None
+        self.captured_at = time.perf_counter()
+        self.processed += 1
+        return True, frame
+
+    def stop(self):
+        pass
+
+class LoopbackPort:
+    """
+    Serial port standing in for the micro:bit, the writes take as long as on a real line of `baudrate`.
+    """
+    def __init__(self, baudrate=BAUDRATE):
+        self.baudrate = baudrate
+        self.written = 0
+
+    def write(self, data):
+        if self.baudrate > 0:
+            time.sleep(len(data) * 10 / self.baudrate)    # 8 data bits, a start bit and a stop bit per byte
+        self.written += len(data)
+        return len(data)
+
+class ReplayEngine(engine.DetectionEngine):
+    """
+    Detection engine reading the recorded sources instead of the cameras.
+
+    The latencies of the whole run are kept, not only the most recent LATENCY_WINDOW frames.
+    """
+    def __init__(self, paths, max_frames=0):
+        super(ReplayEngine, self).__init__(range(len(paths)))
+        self.paths = paths
+        self.max_frames = max_frames
+        self.grabbers = []
+        self.latency = engine.LatencyStats(tuple(self.latency.samples), size=None)
+
+    def open_grabbers(self):
+        self.grabbers = [ReplaySource(path, self.max_frames) for path in self.paths]
+        for path, grabber in zip(self.paths, self.grabbers):
+            if not grabber.cap.isOpened():
+                logging.error("無法打開錄製的來源：{}".format(path))
+                return None
+        return self.grabbers
+
+# Peak resident memory of the process in MiB
+def get_peak_memory():
+    try:
+        import resource
+    except ImportError:
+        return psutil.Process().memory_info().peak_wset / 2**20   # Windows
+    # ru_maxrss is in KiB on Linux, in bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if sys.platform == 'darwin' else 2**10)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay recorded frames through the detection pipeline and report the performance as JSON")
+    parser.add_argument('sources', nargs='+', help="video files or image directories, several sources are replayed as several cameras")
+    parser.add_argument('--model', help="model file, defaults to the model of config.ini")
+    parser.add_argument('--imgsz', type=int, help="inference resolution")
+    parser.add_argument('--device', help="cpu, cuda:0, mps ...")
+    parser.add_argument('--half', action=argparse.BooleanOptionalAction, help="FP16 inference")
+    parser.add_argument('--threads', type=int, help="number of CPU threads used by torch")
+    parser.add_argument('--export-format', choices=['none'] + list(engine.EXPORT_SUFFIXES), help="runtime the model is exported to")
+    parser.add_argument('--frames', type=int, default=0, help="maximum number of frames replayed per source, 0 for all")
+    parser.add_argument('--baudrate', type=int, default=BAUDRATE, help="speed of the emulated serial line, 0 for instant writes")
+    parser.add_argument('--output', help="file the JSON report is written to, defaults to the standard output")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    # Take the rule and the options from config.ini, the command line overrides the inference options
+    try:
+        engine.read_config()
+    except FileNotFoundError:
+        engine.blank_config()
+    for key in engine.OPTIONS['INFERENCE']:
+        value = getattr(args, key, None)
+        if value is not None:
+            engine.config['INFERENCE'][key] = str(value)
+    engine.config['DISPLAY']['preview_mode'] = 'off'
+
+    model_file = args.model or engine.config['SETTINGS']['yolo_model']
+    if not model_file:
+        logging.error("沒有選擇模型")
+        return 1
+    load_started = time.perf_counter()
+    engine.model, engine.inference_args = engine.prepare_model(model_file, engine.get_model_key(model_file),
+                                                               lambda state: logging.info("模型{}".format(state)))
+    load_time = time.perf_counter() - load_started
+    engine.rule = engine.build_rule(engine.get_config_settings())
+
+    # Write the commands to the emulated micro:bit
+    engine.ser = LoopbackPort(args.baudrate)
+    engine.serial_writer = engine.create_serial_writer(engine.ser)
+    engine.serial_writer.start()
+
+    detector = ReplayEngine(args.sources, args.frames)
+    started = time.perf_counter()
+    detector.detect()
+    elapsed = time.perf_counter() - started
+    engine.serial_writer.stop()
+    if not detector.grabbers or not any(grabber.exhausted for grabber in detector.grabbers):
+        return 1
+
+    writer = engine.serial_writer
+    report = {
+        'model': model_file,
+        'sources': args.sources,
+        'inference': {key: engine.get_option('INFERENCE', key) for key in engine.OPTIONS['INFERENCE']},
+        'load_seconds': load_time,
+        'frames': detector.frame_index,
+        'seconds': elapsed,
+        'fps': detector.frame_index / elapsed if elapsed > 0 else 0.0,
+        'latency_ms': {stage: dict(zip(('p50', 'p95', 'p99'), (value * 1000 for value in percentiles)))
+                       for stage, percentiles in detector.latency_summary().items()},
+        'commands': {
+            'sent': writer.sent,
+            'bytes': writer.bytes_sent,
+            'dropped': writer.dropped,
+            'repeated': writer.repeated,
+            'errors': writer.errors,
+            'max_queue_depth': writer.max_queue_depth
+        },
+        'peak_memory_mb': get_peak_memory()
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as report_file:
+            report_file.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1608 @@
+# Created and maintained by: Minedient
+# GPL-3.0 License
+
+# Detection engine: capture -> inference -> rules -> serial, without any Qt dependency.
+# The window (yolo2microbit.py) and the command line drive the same engine:
+#
+#   python engine.py --config config.ini --no-preview
+
+import sys, os, re
+import argparse
+import signal
+import importlib
+import logging
+import configparser
+import json
+import threading
+import time
+import hashlib
+import shutil
+import collections
+import numpy as np
+
+class LazyModule:
+    """
+    Module imported on the first access to one of its attributes, from any thread.
+
+    torch, ultralytics and OpenCV take seconds to import, so the window can show before
+    they are loaded. load() imports the module ahead of time, e.g. in a background thread.
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+# Model related libraries
+ultralytics = LazyModule('ultralytics')
+torch = LazyModule('torch')
+# Serial communication related libraries
+serial = LazyModule('serial')
+list_ports = LazyModule('serial.tools.list_ports')
+# OpenCV related libraries
+cv2 = LazyModule('cv2')
+
+# Set up configuration parser
+config = configparser.ConfigParser(interpolation=None)  # Ensure no interpolation is done, so % can be used in the text
+
+# Set up logger
+logging.basicConfig(format='%(asctime)s %(message)s', datefmt='%Y-%m-%d %H:%M:%S', level=logging.INFO)
+
+# Disable ultralytics logging
+logging.getLogger('ultralytics').setLevel(logging.ERROR)
+
+# Constants
+PID_MICROBIT = 516
+VID_MICROBIT = 3368
+TIMEOUT = 1.0
+FLUSH_TIMEOUT = 2.0 # Seconds the last commands get to be written when the detection stops
+FIRST_FRAME_TIMEOUT = 10.0  # Seconds the cameras get to deliver their first frame, auto exposure and format negotiation can be slow
+BAUD_RATE = 115200
+RECONNECT_MIN = 0.5 # Seconds before the first reconnection attempt
+OFFLINE_POLICIES = ('drop', 'latest', 'buffer')
+CONFIG_FILE = 'config.ini'
+CONDITIONALS = {
+    0: lambda x, y: x > y,
+    1: lambda x, y: x >= y,
+    2: lambda x, y: x == y,
+    3: lambda x, y: x != y,
+    4: lambda x, y: x < y,
+    5: lambda x, y: x <= y
+}
+OPERATORS = {   # Operators of the rule table, mapped to CONDITIONALS
+    '>': 0,
+    '>=': 1,
+    '==': 2,
+    '!=': 3,
+    '<': 4,
+    '<=': 5
+}
+SETTINGS = {
+    'first_type': ('typeComboBox', 'currentIndex', 'setCurrentIndex', '0'),
+    'second_type': ('typeComboBox_2', 'currentIndex', 'setCurrentIndex', '0'),
+    'first_relation': ('relationComboBox', 'currentIndex', 'setCurrentIndex', '0'),
+    'second_relation': ('relationComboBox_2', 'currentIndex', 'setCurrentIndex', '0'),
+    'first_number': ('numberSpinBox','value', 'setValue', '0'),
+    'second_number': ('numberSpinBox_2','value', 'setValue', '0'),
+    'logic': ('logicComboBox','currentIndex', 'setCurrentIndex', '0'),
+    'command_text': ('lineEdit', 'text', 'setText', ''),
+    'command_text_else': ('lineEdit_2', 'text', 'setText', ''),
+    'has_negate': ('hasNegate', 'isChecked', 'setChecked', 'False'),
+    'confidence': ('confSpinBox', 'value', 'setValue', '0.5'),
+    'selected_only': ('selectedOnlyCheckBox', 'isChecked', 'setChecked', 'False'),
+    'camera': ('cameraComboBox', 'currentText', 'setCurrentText', 'video0')
+}
+# Options without a widget, only set through the ini file. Each section maps the keys to their default values
+OPTIONS = {
+    'INFERENCE': {
+        'imgsz': '640',         # Inference resolution (longest side)
+        'device': 'cpu',        # cpu, cuda:0, mps ...
+        'half': 'False',        # FP16 inference, only supported on GPU
+        'threads': '0',         # Number of CPU threads used by torch, 0 to keep the default
+        'warmup': 'True',       # Run one dummy inference at load time
+        'export_format': 'none',# Export the model once to a faster runtime: none, onnx, openvino or torchscript
+    },
+    'DISPLAY': {
+        'preview_mode': 'full', # full: show every frame, capped: show at most preview_fps frames per second, off: no preview window at all
+        'preview_fps': '10',    # Display rate of the capped mode
+        'overlay': 'False',     # Draw the FPS and the latencies on the preview frames
+    },
+    'SERIAL': {
+        'write_timeout': '0.5', # Seconds before a write to a stuck micro:bit is given up
+        'queue_size': '8',      # Maximum number of commands waiting to be written
+        'coalesce': 'True',     # Only keep the latest command of each rule when newer ones arrive before the older ones are sent
+        'framing': 'raw',       # raw: bytes as is, newline: one command per line, length: one length byte before each command
+        'max_rate': '0',        # Maximum number of commands written per second, 0 for no limit
+        'repeat_interval': '0', # Seconds during which a repeated identical command is not sent again
+        'offline_policy': 'latest', # Commands sent while the micro:bit is unplugged: drop, latest (only the newest of each rule is written once it is back) or buffer (up to queue_size, even with coalesce)
+        'watch_interval': '1.0',# Seconds between the checks for the micro:bit being unplugged or plugged in again
+        'reconnect_max': '10',  # Maximum seconds between two reconnection attempts, the wait doubles after every failure
+    },
+    'CAPTURE': {
+        'sources': '',          # Camera indices of the multi-camera mode, e.g. 0,2, empty to use the camera chosen in the window
+        'backend': 'any',       # any, v4l2, dshow, msmf, gstreamer or ffmpeg
+        'width': '0',           # Requested frame size, 0 to keep the driver default
+        'height': '0',
+        'fps': '0',             # Requested frame rate, 0 to keep the driver default
+        'fourcc': '',           # Requested pixel format, e.g. MJPG for higher frame rates on USB webcams
+        'buffer_size': '0',     # Frames buffered by the driver, 1 for the lowest latency, 0 to keep the driver default
+    },
+    'ROI': {
+        'crop': '',             # x1,y1,x2,y2: only this region of the frames goes through the model, empty for the whole frame
+    },
+    'SCHEDULER': {
+        'motion_threshold': '0',# Mean gray level difference that counts as motion, 0 to run the model on every frame
+        'motion_size': '64',    # Width of the downscaled frame used to detect motion
+        'max_interval': '1.0',  # Maximum seconds between two inferences, even without motion
+    },
+    'SMOOTHING': {
+        'method': 'none',       # Temporal filter of the label counts: none, median, mode, ema or hysteresis
+        'window': '5',          # Number of frames used by the median and mode filters
+        'alpha': '0.5',         # Weight of the newest frame in the ema filter
+        'hold_time': '0.3',     # Seconds a new count has to stay stable before the hysteresis filter accepts it
+    },
+}
+EXPORT_SUFFIXES = {
+    'onnx': '.onnx',
+    'openvino': '_openvino_model',
+    'torchscript': '.torchscript'
+}
+EXPORT_CACHE_DIR = '.yolo2microbit_cache' # Created next to the .pt file
+MODEL_CACHE_SIZE = 2 # Number of loaded models kept in memory
+CAPTURE_BACKENDS = {   # Names of the cv2 constants, resolved once OpenCV is loaded
+    'any': 'CAP_ANY',
+    'v4l2': 'CAP_V4L2',
+    'dshow': 'CAP_DSHOW',
+    'msmf': 'CAP_MSMF',
+    'gstreamer': 'CAP_GSTREAMER',
+    'ffmpeg': 'CAP_FFMPEG'
+}
+CAPTURE_PROPERTIES = {  # Options of the CAPTURE section set through cap.set, in this order
+    'width': 'CAP_PROP_FRAME_WIDTH',
+    'height': 'CAP_PROP_FRAME_HEIGHT',
+    'fps': 'CAP_PROP_FPS',
+    'buffer_size': 'CAP_PROP_BUFFERSIZE'
+}
+CAM_INDEX = 0 # Default camera index
+MAX_CAMERAS = 8 # Number of camera indices probed where the devices cannot be listed
+CAMERA_PROBE_TIMEOUT = 3.0 # Seconds a camera gets to answer the probe
+STATUS_INTERVAL = 1.0 # Seconds between the status (counts/FPS) updates sent to the UI
+LABEL_INTERVAL = 0.2 # Minimum seconds between the updates of the sent command shown in the UI
+LATENCY_WINDOW = 512 # Most recent samples per stage used for the latency percentiles
+LATENCY_STAGES = {  # Timed stages of the pipeline and their names in the UI, in pipeline order
+    'capture': '擷取',
+    'inference': '推理',
+    'counting': '計數',
+    'rules': '規則',
+    'preview': '預覽',
+    'serial': '發送',
+    'end_to_end': '端到端'
+}
+
+# Global variables
+model = None
+inference_args = {}
+model_cache = collections.OrderedDict()
+model_cache_lock = threading.Lock()
+end_capture = False
+ser = None
+serial_writer = None
+serial_watcher = None
+rule = None
+camera_cache = {}
+
+# Import the heavy libraries ahead of their first use, called in a background thread by the window
+def import_libraries():
+    started = time.perf_counter()
+    try:
+        for module in (cv2, serial, list_ports, torch, ultralytics):
+            module.load()
+    except ImportError as e:
+        logging.error("無法載入函式庫：{}".format(e))
+        return
+    logging.info("函式庫已載入，耗時 {:.2f} 秒".format(time.perf_counter() - started))
+
+# Function to find the port for the micro:bit
+def find_port(pid, vid, baud):
+    port = serial.Serial(timeout=TIMEOUT, write_timeout=get_option('SERIAL', 'write_timeout'))
+    port.baudrate = baud
+    ports = list(list_ports.comports())
+    logging.info("搜尋Micro:bit中...")
+    for p in ports:
+        if (p.pid == pid) and (p.vid == vid):
+            logging.info('找到目標 PID: {} VID: {} Port: {}'.format(
+                p.pid, p.vid, p.device))
+            port.port = str(p.device)
+            return port
+    return None
+
+# Get the device name of the micro:bit, None if it is not plugged in
+def find_device(pid, vid):
+    for p in list_ports.comports():
+        if (p.pid == pid) and (p.vid == vid):
+            return str(p.device)
+    return None
+
+# Draw the bounding boxes of the detected objects in the captured frame
+def draw_boxes(frame, xyxy, conf, cls, names):
+    xyxy = xyxy.astype(int) # convert to int values
+    conf = np.ceil(conf * 100) / 100
+    for (x1, y1, x2, y2), confidence, c in zip(xyxy.tolist(), conf.tolist(), cls.tolist()):
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 255), 3)
+        y = y1 - 15 if y1 - 15 > 15 else y1 + 15
+        cv2.putText(frame, f"{names[c]}: {confidence:.2f}", (x1, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+# Get the arguments passed to the model, so the predictor filters by confidence and class during NMS
+# With the selected classes only, the classes of the table rules are detected too, otherwise those rules could never fire
+def get_predict_args(rule, table_classes=frozenset()):
+    classes = sorted(table_classes.union(rule.classes)) if rule.classes is not None else None
+    return {'conf': rule.conf, 'classes': classes, 'verbose': False, **inference_args}
+
+# Only PyTorch models take the frames of several sources in one call, the exported runtimes have a static batch size of one
+def supports_batch(loaded_model):
+    return str(getattr(loaded_model, 'model_name', '')).endswith('.pt')
+
+# Check which points lie inside the polygon, for all the points and edges at once (even-odd rule)
+def points_in_polygon(points, polygon):
+    x, y = points[:, 0:1], points[:, 1:2]
+    x1, y1 = polygon[:, 0], polygon[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    # The edges crossing the horizontal line through each point, and where they cross it
+    crosses = (y1 <= y) != (y2 <= y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    return np.count_nonzero(crosses & (x < x_cross), axis=1) % 2 == 1
+
+# Get the label counts from the results (already filtered by the predictor), one result per source
+# The boxes are drawn only if the frames are given, offset is the top left corner of the cropped region
+# Returns the counts as one array: the totals over all sources indexed by the class id, followed by
+# the counts of each source, then the counts of each zone (by the center of the boxes)
+def get_label_counts(results, frames=None, zones=(), offset=(0, 0)):
+    class_count = len(model.names)
+    counts = np.zeros((1 + len(results) + len(zones)) * class_count, dtype=np.int64)
+    zone_start = (1 + len(results)) * class_count
+    for source, result in enumerate(results):
+        if result is None or len(result.boxes) == 0:
+            continue
+
+        # Move all the boxes to numpy in one transfer, the last two columns are confidence and class
+        data = result.boxes.data.cpu().numpy()
+        cls = data[:, -1].astype(np.intp)
+        xyxy = data[:, :4] + np.tile(offset, 2)
+
+        # Count all classes in one pass
+        source_counts = np.bincount(cls, minlength=class_count)
+        counts[:class_count] += source_counts
+        counts[(source + 1) * class_count:(source + 2) * class_count] = source_counts
+
+        # Count the boxes whose center is inside each zone
+        if zones:
+            centers = (xyxy[:, :2] + xyxy[:, 2:]) / 2
+            for zone, (_, polygon) in enumerate(zones):
+                inside = points_in_polygon(centers, polygon)
+                start = zone_start + zone * class_count
+                counts[start:start + class_count] += np.bincount(cls[inside], minlength=class_count)
+
+        # Draw bounding boxes
+        if frames is not None:
+            draw_boxes(frames[source], xyxy, data[:, -2], cls, model.names)
+
+    return counts
+
+# Draw the cropped region and the zones in the captured frame
+def draw_regions(frame, crop, zones):
+    if crop is not None:
+        cv2.rectangle(frame, crop[:2], crop[2:], (255, 255, 0), 2)
+    for name, polygon in zones:
+        cv2.polylines(frame, [polygon.astype(np.int32)], True, (0, 255, 255), 2)
+        cv2.putText(frame, name, tuple(polygon[0].astype(int).tolist()), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2)
+
+# Format the latency percentiles of the stages in milliseconds, one line per stage
+# The overlay uses the stage keys, as OpenCV can only draw ASCII text
+def format_latency(summary, ascii=False):
+    return ["{} p50 {:.1f} / p95 {:.1f} / p99 {:.1f} ms".format(stage if ascii else name, *(value * 1000 for value in summary[stage]))
+            for stage, name in LATENCY_STAGES.items() if stage in summary]
+
+# Draw the frame rate and the latencies in the captured frame
+def draw_latency(frame, fps, summary):
+    for i, line in enumerate(['{:.1f} FPS'.format(fps)] + format_latency(summary, ascii=True)):
+        cv2.putText(frame, line, (10, 20 + 18 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+
+# Get a count by its index in the label counts, 0 if no class is selected
+def count_of(label_counts, index):
+    return int(label_counts[index]) if 0 <= index < len(label_counts) else 0
+
+# The rule set up in the UI, compiled once so the detection loop never reads the widgets
+Rule = collections.namedtuple('Rule', [
+    'class1', 'class2',         # Class ids of the two counters
+    'check1', 'check2',         # Comparators resolved from CONDITIONALS
+    'number1', 'number2',
+    'logic',                    # 0: first condition only, 1: or, 2: and
+    'command', 'command_else',  # CommandTemplate
+    'has_negate',
+    'conf', 'classes'           # Predictor arguments, classes is None to detect all classes
+])
+
+class CommandTemplate:
+    """
+    Command text parsed once into literal and placeholder segments, rendered straight to bytes.
+
+    Placeholders: %1 and %2 the two counters of the rule, %{name} the count of any class
+    (or %{video1:name} the count in one source), %f the frame rate, %t the unix timestamp, %n the frame index and %% a literal %.
+    Templates that only use counts keep a small cache of the rendered commands keyed by those counts.
+    """
+    CACHE_SIZE = 32
+
+    def __init__(self, text, count_indices):
+        self.text = text
+        self.segments = []      # bytes for the literals, (kind, value) for the placeholders
+        literal = ''
+        for part in re.split(r'(%%|%[12fnt]|%\{[^}]*\})', text):
+            if part == '%%':
+                literal += '%'
+            elif part in ('%1', '%2'):
+                self._add(literal, ('counter', int(part[1]) - 1))
+                literal = ''
+            elif part in ('%f', '%n', '%t'):
+                self._add(literal, (part[1], None))
+                literal = ''
+            elif part.startswith('%{'):
+                self._add(literal, ('class', count_indices.get(part[2:-1], -1)))   # Unknown classes count as 0
+                literal = ''
+            else:
+                literal += part
+        self._add(literal, None)
+        self.counts_only = all(kind in ('counter', 'class') for kind, _ in self.placeholders)
+        self._cache = collections.OrderedDict()
+
+    def _add(self, literal, placeholder):
+        if literal:
+            self.segments.append(literal.encode())
+        if placeholder is not None:
+            self.segments.append(placeholder)
+
+    @property
+    def placeholders(self):
+        return [segment for segment in self.segments if isinstance(segment, tuple)]
+
+    def render(self, counters, label_counts, fps=0.0, frame_index=0):
+        """Render the command to bytes"""
+        if self.counts_only:
+            key = tuple(counters[value] if kind == 'counter' else count_of(label_counts, value) for kind, value in self.placeholders)
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+                return data
+
+        parts = []
+        for segment in self.segments:
+            if isinstance(segment, bytes):
+                parts.append(segment)
+                continue
+            kind, value = segment
+            if kind == 'counter':
+                parts.append(str(counters[value]).encode())
+            elif kind == 'class':
+                parts.append(str(count_of(label_counts, value)).encode())
+            elif kind == 'f':
+                parts.append(f"{fps:.1f}".encode())
+            elif kind == 'n':
+                parts.append(str(frame_index).encode())
+            elif kind == 't':
+                parts.append(str(int(time.time())).encode())
+        data = b''.join(parts)
+
+        if self.counts_only:
+            self._cache[key] = data
+            if len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return data
+
+# Get the camera indices of the sources option, or the given camera when it is empty
+def get_sources(camera):
+    return [int(index) for index in re.findall(r'\d+', str(get_option('CAPTURE', 'sources')))] or [camera]
+
+# Get the cropped region of the ROI section as (x1, y1, x2, y2), None for the whole frame
+def get_crop():
+    crop = [int(value) for value in re.findall(r'\d+', str(get_option('ROI', 'crop')))]
+    if not crop:
+        return None
+    if len(crop) != 4 or crop[2] <= crop[0] or crop[3] <= crop[1]:
+        logging.error("無效的裁剪區域，將使用整個畫面")
+        return None
+    return tuple(crop)
+
+# Get the zones of the [ZONES] section, e.g. `door = 100,0 300,0 300,480 100,480`, as (name, polygon) pairs
+def get_zones():
+    zones = []
+    if config.has_section('ZONES'):
+        for name, text in config['ZONES'].items():
+            points = [float(value) for value in re.findall(r'-?\d+(?:\.\d+)?', text)]
+            if len(points) < 6 or len(points) % 2:
+                logging.error(f"區域 {name} 至少需要三個點")
+                continue
+            zones.append((name, np.array(points).reshape(-1, 2)))
+    return zones
+
+# Map the names used in rules and templates to their index in the label counts:
+# the class names for the totals, "video1:name" for the counts of each source and "zone:name" for each zone
+def get_count_indices(sources, zones):
+    if model is None:
+        return {}
+    class_count = len(model.names)
+    count_indices = {name: class_id for class_id, name in model.names.items()}
+    prefixes = [camera_name(camera) for camera in sources] + [zone for zone, _ in zones]
+    for block, prefix in enumerate(prefixes):
+        for class_id, name in model.names.items():
+            count_indices[f"{prefix}:{name}"] = (block + 1) * class_count + class_id
+    return count_indices
+
+# Build the rule from the values of the SETTINGS keys
+def build_rule(settings):
+    count_indices = get_count_indices(get_sources(camera_index(str(settings['camera']))), get_zones())
+    class1, class2 = settings['first_type'], settings['second_type']
+    logic = settings['logic']
+    classes = None
+    if settings['selected_only']:
+        classes = sorted({class1, class2} if logic != 0 else {class1})
+    return Rule(
+        class1, class2,
+        CONDITIONALS.get(settings['first_relation'], lambda x, y: False),
+        CONDITIONALS.get(settings['second_relation'], lambda x, y: False),
+        settings['first_number'], settings['second_number'],
+        logic,
+        CommandTemplate(str(settings['command_text']), count_indices),
+        CommandTemplate(str(settings['command_text_else']), count_indices),
+        settings['has_negate'],
+        settings['confidence'], classes
+    )
+
+# Get the values of the SETTINGS keys from the configuration file, for running without the window
+def get_config_settings():
+    return {key: get_setting(key) for key in SETTINGS}
+
+# Get a value of the SETTINGS section, falling back to the default for settings missing in older configuration files
+# The texts of the line edits stay strings, so commands like "01" or "2.50" are sent as typed
+def get_setting(key):
+    value = config['SETTINGS'].get(key, SETTINGS[key][3])
+    return unescape(value) if SETTINGS[key][1] == 'text' else ensure_ini_type(value)
+
+# This function process if the logic relation of the two counters with the given relation and number are met
+def counter_logic(rule, type1Counter, type2Counter):
+    type1Result = rule.check1(type1Counter, rule.number1)
+    if rule.logic == 0:
+        return type1Result
+    else:
+        type2Result = rule.check2(type2Counter, rule.number2)
+        return type1Result or type2Result if rule.logic == 1 else type1Result and type2Result
+
+# A rule of the [RULES] table in the ini file, e.g. `crowd = person>=3 and chair==0 -> A`
+TableRule = collections.namedtuple('TableRule', [
+    'name',
+    'groups',                   # Condition in disjunctive form: the rule holds if all the terms of any group hold
+    'inputs',                   # Indices of the label counts referenced by the condition
+    'counters',                 # Indices of the %1 and %2 placeholders: the first two counts referenced
+    'command'                   # CommandTemplate
+])
+
+# Parse one rule of the table, class names are resolved to count indices here so evaluating only compares integers
+def parse_rule(name, text, count_indices):
+    if '->' not in text:
+        raise ValueError(f"規則 {name} 缺少 '->' 和指令")
+    condition, command = text.split('->', 1)
+    groups, inputs = [], []
+    # "and" binds tighter than "or"
+    for group_text in re.split(r'\s+or\s+', condition.strip()):
+        group = []
+        for term in re.split(r'\s+and\s+', group_text.strip()):
+            match = re.fullmatch(r'\s*(.+?)\s*(>=|<=|==|!=|>|<)\s*(\d+)\s*', term)
+            if match is None:
+                raise ValueError(f"規則 {name} 的條件無效：{term}")
+            label, operator, number = match.groups()
+            if label not in count_indices:
+                raise ValueError(f"規則 {name} 使用了模型中沒有的類別：{label}")
+            group.append((count_indices[label], CONDITIONALS[OPERATORS[operator]], int(number)))
+            if count_indices[label] not in inputs:
+                inputs.append(count_indices[label])
+        groups.append(tuple(group))
+    counters = (inputs[0], inputs[1] if len(inputs) > 1 else inputs[0])
+    return TableRule(name, tuple(groups), tuple(inputs), counters, CommandTemplate(command.strip(), count_indices))
+
+# Check if the condition of a table rule holds for the given counts
+def rule_holds(table_rule, label_counts):
+    return any(all(check(label_counts[index], number) for index, check, number in group) for group in table_rule.groups)
+
+class RuleSet:
+    """
+    The rules of the [RULES] table, evaluated in a single pass over the per-frame class count vector.
+
+    Rules are indexed by the counts they reference, so a frame only evaluates the rules
+    whose inputs changed since the previous frame, and the cost stays flat as the table grows.
+    Like the rule in the UI, a rule fires when its inputs change and its condition holds.
+    """
+    def __init__(self, rules, size):
+        self.rules = rules
+        self.by_input = collections.defaultdict(list)
+        for index, table_rule in enumerate(rules):
+            for count_index in table_rule.inputs:
+                self.by_input[count_index].append(index)
+        self.previous = np.zeros(size, dtype=np.int64)
+
+    def evaluate(self, label_counts):
+        """Return the rules that fire for the given counts"""
+        changed = np.flatnonzero(label_counts != self.previous)
+        self.previous = label_counts.copy()
+        if not self.rules or len(changed) == 0:
+            return []
+        candidates = sorted({index for count_index in changed.tolist() for index in self.by_input.get(count_index, ())})
+        return [self.rules[index] for index in candidates if rule_holds(self.rules[index], label_counts)]
+
+    def classes(self, class_count):
+        """Return the class ids referenced by the rules, whether they count a camera, a zone or all of them"""
+        return frozenset(count_index % class_count for count_index in self.by_input)
+
+# Create the rule set from the [RULES] table of the ini file, invalid rules are logged and skipped
+def create_rule_set(sources, zones):
+    count_indices = get_count_indices(sources, zones)
+    rules = []
+    if config.has_section('RULES'):
+        for name, text in config['RULES'].items():
+            try:
+                rules.append(parse_rule(name, text, count_indices))
+            except ValueError as e:
+                logging.error(str(e))
+    if rules:
+        logging.info(f"已加載 {len(rules)} 條規則")
+    return RuleSet(rules, (1 + len(sources) + len(zones)) * len(model.names))
+
+class MotionGate:
+    """
+    Decides if a frame of one source needs to go through the model.
+
+    A downscaled gray copy of the frame is compared with the one of the last frame that
+    went through the model; when the scene did not move, the previous detections are
+    reused. An inference is forced at least every `max_interval` seconds.
+    """
+    def __init__(self, threshold, size, max_interval):
+        self.threshold = threshold
+        self.size = max(size, 8)
+        self.max_interval = max_interval
+        self.reference = None
+        self.last_inference = 0.0
+        self.inferred = 0
+        self.skipped = 0
+
+    def thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (self.size, max(self.size * height // width, 1)), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def needs_inference(self, frame, now):
+        if self.threshold <= 0:
+            self.inferred += 1
+            return True
+        thumbnail = self.thumbnail(frame)
+        if (self.reference is None or now - self.last_inference >= self.max_interval
+                or cv2.absdiff(thumbnail, self.reference).mean() >= self.threshold):
+            self.reference = thumbnail
+            self.last_inference = now
+            self.inferred += 1
+            return True
+        self.skipped += 1
+        return False
+
+# Create the motion gate of one source from the ini file
+def create_motion_gate():
+    return MotionGate(get_option('SCHEDULER', 'motion_threshold'), get_option('SCHEDULER', 'motion_size'),
+                      get_option('SCHEDULER', 'max_interval'))
+
+class LatencyStats:
+    """
+    Rolling latency samples of the pipeline stages, in seconds.
+
+    Recording a sample only appends to a bounded deque, so the timers can stay on in
+    production; the percentiles are computed when summary() is called, once every
+    STATUS_INTERVAL seconds. Samples can be recorded from several threads.
+    """
+    def __init__(self, stages, size=LATENCY_WINDOW):
+        self.samples = {stage: collections.deque(maxlen=size) for stage in stages}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def summary(self):
+        """Return the (p50, p95, p99) of every stage with samples, in seconds"""
+        with self._lock:
+            samples = {stage: np.fromiter(values, dtype=np.float64) for stage, values in self.samples.items() if values}
+        return {stage: tuple(np.percentile(values, (50, 95, 99))) for stage, values in samples.items()}
+
+class FrameGrabber(threading.Thread):
+    """
+    Capture thread that keeps only the newest camera frame in a one-slot buffer.
+
+    Frames that arrive while the detection loop is still busy replace the pending
+    frame instead of queuing up, so the loop always works on the freshest frame.
+    `processed` counts the frames handed out by read(), `dropped` the frames that
+    were overwritten before anyone read them.
+
+    Frame buffers are recycled through cap.read(image=...): the frame returned by
+    read() belongs to the caller until the next read(), then goes back to the pool.
+    `allocations` counts the buffers OpenCV had to allocate, and stops growing once
+    the pool is warm (one buffer being filled, one pending, one held by the caller).
+
+    `captured_at` is the time.perf_counter() at which the frame returned by the last
+    read() came out of the camera.
+    """
+    exhausted = False   # Cameras never run out of frames, unlike the recorded sources of the benchmark
+    def __init__(self, cap):
+        super(FrameGrabber, self).__init__(daemon=True)
+        self.cap = cap
+        self.processed = 0
+        self.dropped = 0
+        self.allocations = 0
+        self.captured_at = 0.0
+        self._frame = None
+        self._frame_time = 0.0
+        self._held = None
+        self._free = []
+        self._failed = False
+        self._running = True
+        self._condition = threading.Condition()
+
+    def run(self):
+        while self._running:
+            with self._condition:
+                buffer = self._free.pop() if self._free else None
+            ret, frame = self.cap.read(image=buffer) if buffer is not None else self.cap.read()
+            captured_at = time.perf_counter()
+            with self._condition:
+                if not ret:
+                    self._failed = True
+                    self._condition.notify_all()
+                    break
+                if frame is not buffer:
+                    self.allocations += 1
+                if self._frame is not None:
+                    self.dropped += 1
+                    self._free.append(self._frame)
+                self._frame, self._frame_time = frame, captured_at
+                self._condition.notify_all()
+
+    def read(self, timeout=TIMEOUT):
+        """Wait for and take the newest frame, returns (ret, frame) like cv2.VideoCapture.read"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._frame is not None or self._failed, timeout)
+            frame, self._frame = self._frame, None
+            if frame is None:
+                return False, None
+            # The previous frame is no longer used by the caller, recycle it
+            if self._held is not None:
+                self._free.append(self._held)
+            self._held = frame
+            self.captured_at = self._frame_time
+        self.processed += 1
+        return True, frame
+
+    def stop(self):
+        """Stop the capture thread and wait for the pending cap.read() to return"""
+        self._running = False
+        self.join()
+
+# Frame a single command, so the micro:bit can separate consecutive commands
+def frame_length_prefixed(data):
+    if len(data) > 255:
+        raise ValueError("指令長度超過255位元組")
+    return bytes([len(data)]) + data
+
+SERIAL_FRAMINGS = {
+    'raw': lambda data: data,
+    'newline': lambda data: data.replace(b'\n', b'') + b'\n',
+    'length': frame_length_prefixed
+}
+
+class SerialWriter(threading.Thread):
+    """
+    Dedicated thread that writes the commands to the micro:bit.
+
+    send() only queues the bytes and returns immediately, so a slow or stuck micro:bit
+    never stalls the detection loop. The queue is bounded; with `coalesce` enabled only
+    the latest pending command of each source is kept, as the older ones are outdated anyway.
+    The source is the rule the command comes from: None for the rule of the window (and the
+    manual and reset commands), the name for the rules of the table.
+
+    Commands can be framed (see SERIAL_FRAMINGS) so the micro:bit can tell them apart,
+    written at most `max_rate` times per second, and identical commands of a source repeated
+    within `repeat_interval` seconds are not sent again.
+
+    `latency` keeps the seconds from send() to the end of the write ('serial') and,
+    for commands given the time their frame was captured, from the capture to the
+    end of the write ('end_to_end').
+
+    `port` is None while the micro:bit is disconnected: a failed write detaches the port,
+    and the SerialWatcher attaches a new one. Meanwhile the commands are handled by
+    `offline_policy` (see OFFLINE_POLICIES) and the detection keeps running.
+    """
+    def __init__(self, port, queue_size=8, coalesce=True, framing='raw', max_rate=0, repeat_interval=0, offline_policy='latest'):
+        super(SerialWriter, self).__init__(daemon=True)
+        self.port = port
+        self.coalesce = coalesce
+        self.offline_policy = offline_policy if offline_policy in OFFLINE_POLICIES else 'latest'
+        self.framing = framing if framing in SERIAL_FRAMINGS else 'raw'
+        self.min_interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.repeat_interval = repeat_interval
+        self.reset_statistics()
+        self._queue = collections.deque(maxlen=max(queue_size, 1))
+        self._last_sent = {}    # source -> (bytes, time of send()) of the last command queued
+        self._next_write = 0.0
+        self._writing = False   # A command was taken from the queue and is being written
+        self._running = True
+        self._condition = threading.Condition()
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    def reset_statistics(self):
+        """Start the counters and the latencies over, for a new detection run"""
+        self.sent = 0
+        self.bytes_sent = 0
+        self.dropped = 0
+        self.repeated = 0
+        self.errors = 0
+        self.max_queue_depth = 0    # Most commands waiting at once, a growing backlog means the micro:bit cannot keep up
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.latency = LatencyStats(('serial', 'end_to_end'))
+
+    def attach(self, port):
+        """Write the commands to a newly connected port"""
+        with self._condition:
+            self.port = port
+            self._condition.notify_all()
+
+    def detach(self, port):
+        """Stop writing to a disconnected port, unless another port was attached in the meantime"""
+        with self._condition:
+            if self.port is not port:
+                return
+            self.port = None
+        try:
+            port.close()
+        except (serial.SerialException, OSError):
+            pass
+
+    @property
+    def average_latency(self):
+        """Average seconds between send() and the end of the write"""
+        return self.total_latency / self.sent if self.sent else 0.0
+
+    def send(self, data, captured_at=None, source=None):
+        """Queue the bytes to be written, never blocks"""
+        now = time.perf_counter()
+        with self._condition:
+            # While disconnected, drop the commands, only keep the newest one of each source, or keep them all
+            # depending on the policy; the policy takes over from coalesce until the micro:bit is back
+            if self.port is None and self.offline_policy == 'drop':
+                self.dropped += 1
+                return
+            coalesce = self.offline_policy == 'latest' if self.port is None else self.coalesce
+            # Skip identical commands repeated too soon
+            last_data, last_time = self._last_sent.get(source, (None, 0.0))
+            if data == last_data and now - last_time < self.repeat_interval:
+                self.repeated += 1
+                return
+            self._last_sent[source] = (data, now)
+            if coalesce:
+                # Replace the pending command of the same rule, the commands of the other rules are still sent
+                pending = [item for item in self._queue if item[3] != source]
+                self.dropped += len(self._queue) - len(pending)
+                self._queue.clear()
+                self._queue.extend(pending)
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1   # The oldest command is pushed out of the queue
+            self._queue.append((data, now, captured_at, source))
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            self._condition.notify_all()
+
+    def run(self):
+        while True:
+            with self._condition:
+                # The previous command is written (or given up), wake up flush()
+                self._writing = False
+                self._condition.notify_all()
+                self._condition.wait_for(lambda: (self._queue and self.port is not None) or not self._running)
+                if not self._queue or self.port is None:
+                    break   # Stopped, with nothing left that can be written
+                # Respect the rate limit, newer commands keep coalescing while waiting
+                delay = self._next_write - time.perf_counter()
+                if delay > 0 and self._running:
+                    self._condition.wait(delay)
+                    continue
+                data, queued_at, captured_at, source = self._queue.popleft()
+                port = self.port
+                self._writing = True
+            try:
+                frame = SERIAL_FRAMINGS[self.framing](data)
+            except ValueError as e:
+                self.errors += 1
+                logging.error("無法封裝指令：{}".format(e))
+                continue
+            self._next_write = time.perf_counter() + self.min_interval
+            try:
+                port.write(frame)
+            except serial.SerialTimeoutException:
+                self.errors += 1
+                logging.error("寫入micro:bit超時，已放棄指令：{}".format(data))
+                continue
+            except (serial.SerialException, OSError) as e:
+                # The micro:bit was unplugged or reset, keep the command for the reconnection unless the policy drops it
+                self.errors += 1
+                logging.error("寫入micro:bit時出錯：{}".format(e))
+                self.detach(port)
+                with self._condition:
+                    if len(self._queue) < self._queue.maxlen and (self.offline_policy == 'buffer' or
+                       self.offline_policy == 'latest' and all(item[3] != source for item in self._queue)):
+                        self._queue.appendleft((data, queued_at, captured_at, source))
+                continue
+            written_at = time.perf_counter()
+            latency = written_at - queued_at
+            self.latency.record('serial', latency)
+            if captured_at is not None:
+                self.latency.record('end_to_end', written_at - captured_at)
+            self.sent += 1
+            self.bytes_sent += len(frame)
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """Wait until the queued commands are written, or cannot be written as the port is detached; False on timeout"""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._writing and (not self._queue or self.port is None) or not self.is_alive(), timeout)
+
+    def stop(self):
+        """Stop the thread once the queued commands are written"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self.join()
+
+# Create the writer of the serial port with the options of the SERIAL section
+def create_serial_writer(port):
+    return SerialWriter(port, get_option('SERIAL', 'queue_size'), get_option('SERIAL', 'coalesce'),
+                        str(get_option('SERIAL', 'framing')).lower(), get_option('SERIAL', 'max_rate'),
+                        get_option('SERIAL', 'repeat_interval'), str(get_option('SERIAL', 'offline_policy')).lower())
+
+class SerialWatcher(threading.Thread):
+    """
+    Keeps the serial writer connected to the micro:bit.
+
+    Every `interval` seconds the serial devices are listed: a micro:bit that is unplugged
+    is detached from the writer, and one that is plugged in again (or that failed a write,
+    e.g. after a reset) is reconnected. Failed attempts are retried after a wait that
+    doubles up to `reconnect_max` seconds. The detection never waits for any of this.
+    """
+    def __init__(self, writer, pid, vid, baud, interval=1.0, reconnect_max=10.0):
+        super(SerialWatcher, self).__init__(daemon=True)
+        self.writer = writer
+        self.pid = pid
+        self.vid = vid
+        self.baud = baud
+        self.interval = interval
+        self.reconnect_max = max(reconnect_max, RECONNECT_MIN)
+        self.backoff = RECONNECT_MIN
+        self.reconnections = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        wait = self.interval
+        while not self._stopped.wait(wait):
+            wait = self.interval
+            try:
+                device = find_device(self.pid, self.vid)
+            except OSError as e:
+                logging.error("無法列出序列埠：{}".format(e))
+                continue
+            port = self.writer.port
+            if port is not None:
+                # The micro:bit was unplugged, or came back under another device name
+                if device != port.port:
+                    logging.error("micro:bit已斷開，將在重新插入後自動連接")
+                    self.writer.detach(port)
+            elif device is not None and not self.reconnect(device):
+                # Wait longer after every failed attempt, the micro:bit may still be starting up
+                wait = self.backoff
+                self.backoff = min(self.backoff * 2, self.reconnect_max)
+
+    def reconnect(self, device):
+        try:
+            port = serial.Serial(device, self.baud, timeout=TIMEOUT, write_timeout=get_option('SERIAL', 'write_timeout'))
+        except (serial.SerialException, OSError) as e:
+            logging.error("重新連接micro:bit失敗：{}，{:.1f}秒後重試".format(e, self.backoff))
+            return False
+        self.writer.attach(port)
+        self.backoff = RECONNECT_MIN
+        self.reconnections += 1
+        logging.info("已重新連接到micro:bit：{}".format(device))
+        return True
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+class CountFilter:
+    """
+    Temporal filter applied to the label counts before the rule is checked, the base class passes the counts through.
+
+    Detections flicker between frames, and every flicker would send a command. The filters
+    below trade a bounded delay for stable counts.
+    """
+    def update(self, counts, now):
+        return counts
+
+class MedianFilter(CountFilter):
+    """
+    Median of every class count over the last `window` frames.
+    """
+    def __init__(self, window):
+        self.history = collections.deque(maxlen=max(window, 1))
+
+    def update(self, counts, now):
+        self.history.append(counts)
+        return np.rint(np.median(np.stack(self.history), axis=0)).astype(np.int64)
+
+class ModeFilter(CountFilter):
+    """
+    Most frequent count of every class over the last `window` frames, ties go to the newest count.
+    """
+    def __init__(self, window):
+        self.history = collections.deque(maxlen=max(window, 1))
+
+    def update(self, counts, now):
+        self.history.appendleft(counts)
+        history = np.stack(self.history)
+        # Number of occurrences of each frame's count in the window, per class
+        occurrences = (history[:, None, :] == history[None, :, :]).sum(axis=1)
+        return history[occurrences.argmax(axis=0), np.arange(history.shape[1])]
+
+class EmaFilter(CountFilter):
+    """
+    Exponential moving average of every class count, `alpha` is the weight of the newest frame.
+    """
+    def __init__(self, alpha):
+        self.alpha = min(max(alpha, 0.0), 1.0)
+        self.average = None
+
+    def update(self, counts, now):
+        if self.average is None:
+            self.average = counts.astype(np.float64)
+        else:
+            self.average += self.alpha * (counts - self.average)
+        return np.rint(self.average).astype(np.int64)
+
+class HysteresisFilter(CountFilter):
+    """
+    Only accepts a new count after it stayed the same for at least `hold_time` seconds.
+    """
+    def __init__(self, hold_time):
+        self.hold_time = hold_time
+        self.output = None
+        self.candidate = None
+        self.since = None
+
+    def update(self, counts, now):
+        if self.output is None:
+            self.output, self.candidate = counts.copy(), counts.copy()
+            self.since = np.full(len(counts), now, dtype=np.float64)
+            return self.output
+        changed = counts != self.candidate
+        self.candidate[changed] = counts[changed]
+        self.since[changed] = now
+        accepted = (self.candidate != self.output) & (now - self.since >= self.hold_time)
+        self.output[accepted] = self.candidate[accepted]
+        return self.output
+
+# Create the temporal filter configured in the ini file
+def create_count_filter():
+    method = str(get_option('SMOOTHING', 'method')).lower()
+    if method == 'median':
+        return MedianFilter(get_option('SMOOTHING', 'window'))
+    elif method == 'mode':
+        return ModeFilter(get_option('SMOOTHING', 'window'))
+    elif method == 'ema':
+        return EmaFilter(get_option('SMOOTHING', 'alpha'))
+    elif method == 'hysteresis':
+        return HysteresisFilter(get_option('SMOOTHING', 'hold_time'))
+    elif method != 'none':
+        logging.error(f"不支援的平滑方法：{method}")
+    return CountFilter()
+
+# Candidate camera indices: the /dev/video* nodes on Linux, found without opening any stream, a fixed range elsewhere
+def get_camera_candidates():
+    if sys.platform.startswith('linux'):
+        return sorted(int(name[5:]) for name in os.listdir('/dev') if re.fullmatch(r'video\d+', name))
+    return list(range(MAX_CAMERAS))
+
+# Get the capture backend configured in the ini file
+def get_capture_backend():
+    backend = str(get_option('CAPTURE', 'backend')).lower()
+    if backend not in CAPTURE_BACKENDS:
+        logging.error(f"不支援的攝像頭後端：{backend}")
+        return cv2.CAP_ANY
+    return getattr(cv2, CAPTURE_BACKENDS[backend])
+
+# Open the camera with the capture options of the ini file, and log the values the driver actually uses
+def open_capture(index):
+    cap = cv2.VideoCapture(index, get_capture_backend())
+    if not cap.isOpened():
+        return cap
+
+    # The pixel format goes first, some drivers only offer the higher resolutions and frame rates in MJPG
+    fourcc = str(get_option('CAPTURE', 'fourcc'))
+    if len(fourcc) == 4:
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    elif fourcc:
+        logging.error(f"無效的FOURCC：{fourcc}")
+    for key, prop in CAPTURE_PROPERTIES.items():
+        value = get_option('CAPTURE', key)
+        if value > 0:
+            cap.set(getattr(cv2, prop), value)
+
+    code = int(cap.get(cv2.CAP_PROP_FOURCC))
+    logging.info("攝像頭 {} 使用 {}，{}x{}，{:.1f} FPS，格式 {}，緩衝 {} 幀".format(
+        index, cap.getBackendName(), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        cap.get(cv2.CAP_PROP_FPS), ''.join(chr((code >> 8 * i) & 0xFF) for i in range(4)), int(cap.get(cv2.CAP_PROP_BUFFERSIZE))))
+    return cap
+
+# Check if a camera can deliver frames, grab() skips decoding the frame
+def probe_camera(index):
+    cap = cv2.VideoCapture(index, get_capture_backend())
+    try:
+        return cap.isOpened() and cap.grab()
+    finally:
+        cap.release()
+
+# Find and list all available cameras, the candidates are probed in parallel and the result is cached per candidate list
+def list_available_cameras(refresh=False):
+    candidates = tuple(get_camera_candidates())
+    if not refresh and candidates in camera_cache:
+        return camera_cache[candidates]
+
+    results = {}
+    def probe(index):
+        results[index] = probe_camera(index)
+
+    # Daemon threads, so a camera that never answers cannot block the program
+    threads = [threading.Thread(target=probe, args=(index,), daemon=True) for index in candidates]
+    for thread in threads:
+        thread.start()
+    deadline = time.perf_counter() + CAMERA_PROBE_TIMEOUT
+    for index, thread in zip(candidates, threads):
+        thread.join(max(deadline - time.perf_counter(), 0))
+        if thread.is_alive():
+            logging.warning(f"攝像頭 {index} 沒有回應")
+
+    available = [index for index in candidates if results.get(index)]
+    camera_cache[candidates] = available
+    return available
+
+# Name of a camera in the camera combobox, and back
+def camera_name(index):
+    return f"video{index}"
+
+def camera_index(name):
+    return int(name[5:]) if re.fullmatch(r'video\d+', name) else CAM_INDEX
+
+# Render the command template with the counters and send the command to the micro:bit
+def prepare_and_send_command_text(command, counters, label_counts, fps, frame_index, captured_at=None, source=None):
+    data = command.render(counters, label_counts, fps, frame_index)
+    if serial_writer is not None:   # The connection may be closed from the window while detecting
+        serial_writer.send(data, captured_at, source)
+    return data
+
+# Hash the model file, used to invalidate the exported models when the source model changes
+def hash_file(file_name):
+    sha = hashlib.sha256()
+    with open(file_name, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+# Export the model to the configured format once, and return the path of the cached export
+def get_exported_model(model_file, inference_args):
+    export_format = str(get_option('INFERENCE', 'export_format')).lower()
+    if export_format == 'none' or not model_file.endswith('.pt'):
+        return model_file
+    if export_format not in EXPORT_SUFFIXES:
+        logging.error(f"不支援的導出格式：{export_format}")
+        return model_file
+
+    # The cache key covers the model content and every setting that changes the exported model
+    imgsz, half = inference_args['imgsz'], inference_args['half']
+    key = hashlib.sha256(f"{hash_file(model_file)}-{export_format}-{imgsz}-{half}".encode()).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(model_file))[0]
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(model_file)), EXPORT_CACHE_DIR)
+    cached = os.path.join(cache_dir, f"{stem}-{key}{EXPORT_SUFFIXES[export_format]}")
+    if os.path.exists(cached):
+        logging.info(f"使用已導出的模型：{cached}")
+        return cached
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Remove the exports of older versions of this model, the stem must be followed by the key alone
+        # so yolo11n.pt keeps the exports of yolo11n-seg.pt
+        old_export = re.compile(rf"{re.escape(stem)}-[0-9a-f]{{16}}{re.escape(EXPORT_SUFFIXES[export_format])}")
+        for entry in os.listdir(cache_dir):
+            if old_export.fullmatch(entry):
+                path = os.path.join(cache_dir, entry)
+                shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+
+        # Export from a copy inside the cache directory, so the export never overwrites files next to the model
+        logging.info(f"正在把模型導出為{export_format}格式，只需進行一次……")
+        source = os.path.join(cache_dir, f"{stem}-{key}.pt")
+        shutil.copyfile(model_file, source)
+        try:
+            exported = ultralytics.YOLO(source).export(format=export_format, imgsz=imgsz, half=half, device=inference_args['device'])
+        finally:
+            os.remove(source)
+        if os.path.abspath(exported) != os.path.abspath(cached):
+            shutil.move(exported, cached)
+        logging.info(f"已導出模型：{cached}")
+        return cached
+    except Exception as e:
+        logging.error(f"導出模型時出錯，將使用原本的模型：{e}")
+        return model_file
+
+# Get the inference options of the ini file, applied once at load time instead of on every frame
+def get_inference_args():
+    device = str(get_option('INFERENCE', 'device'))
+    half = get_option('INFERENCE', 'half')
+    if half and device == 'cpu':
+        logging.warning("CPU不支援半精度推理，將使用全精度")
+        half = False
+    return {'imgsz': get_option('INFERENCE', 'imgsz'), 'device': device, 'half': half}
+
+# Key of a model in the cache: the file, its modification time and the options it is loaded with
+def get_model_key(model_file):
+    options = tuple((key, str(get_option('INFERENCE', key))) for key in OPTIONS['INFERENCE'])
+    return (os.path.abspath(model_file), os.path.getmtime(model_file), options)
+
+# Load the model with its inference arguments, or take it from the cache; runs on the model loader thread
+# progress is called with the current state of the loading
+def prepare_model(model_file, key, progress):
+    with model_cache_lock:
+        if key in model_cache:
+            model_cache.move_to_end(key)
+            return model_cache[key]
+
+    args = get_inference_args()
+    threads = get_option('INFERENCE', 'threads')
+    if threads > 0:
+        torch.set_num_threads(threads)
+
+    # Load the model, from the cached export if one is configured
+    progress("導出中")
+    path = get_exported_model(model_file, args)
+    progress("讀取中")
+    loaded = ultralytics.YOLO(path, task='detect')
+
+    # Warm up the model, so the first real frame does not pay the initialization cost
+    if get_option('INFERENCE', 'warmup'):
+        progress("預熱中")
+        imgsz = args['imgsz']
+        loaded(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), verbose=False, **args)
+        logging.info("模型預熱完成")
+
+    # Keep the most recently used models
+    with model_cache_lock:
+        model_cache[key] = (loaded, args)
+        while len(model_cache) > MODEL_CACHE_SIZE:
+            model_cache.popitem(last=False)
+    return loaded, args
+
+# Function to reset the configuration to default
+def blank_config():
+    config['SETTINGS'] = {
+        'yolo_model': '',
+    }
+    for key, value in SETTINGS.items():
+        config['SETTINGS'][key] = value[3]
+    for section, options in OPTIONS.items():
+        config[section] = options
+    config['RULES'] = {}
+    config['ZONES'] = {}
+
+def read_config(file_name=CONFIG_FILE):
+    """Read the configuration file"""
+    if not os.path.exists(file_name):
+        logging.error("找不到/沒有配置文件！")
+        raise FileNotFoundError("找不到/沒有配置文件！")
+    config.read(file_name)
+    # Add the sections and options missing in older configuration files
+    for section, options in OPTIONS.items():
+        if not config.has_section(section):
+            config.add_section(section)
+        for key, value in options.items():
+            config[section].setdefault(key, value)
+
+def get_option(section, key):
+    """Get an option from the ini file, converted to its python type"""
+    if config.has_section(section) and key in config[section]:
+        return ensure_ini_type(config[section][key])
+    return ensure_ini_type(OPTIONS[section][key])
+
+def read_config_json(file_name):
+    """Merge a configuration exported as JSON into the configuration"""
+    with open(file_name, 'r') as f:
+        json_data = json.load(f)
+    for section in json_data:
+        if not config.has_section(section):
+            config.add_section(section)
+        for key in json_data[section]:
+            config[section][key] = json_data[section][key]
+
+def write_to_config(file_name=CONFIG_FILE):
+    """Write the configuration to the ini file"""
+    with open(file_name, 'w') as configfile:
+        config.write(configfile)
+
+def print_config():
+    """Print the configuration to the console"""
+    for key in config['SETTINGS']:
+        logging.debug(f"{key} = {config['SETTINGS'][key]}")
+
+### Utility Functions Section Start ###
+
+ESCAPED_CHARACTERS = ['\n', '\r', '\t', '\f', '\v', '#', ';', ' ', '=', ':']   # Texts holding these are quoted in the ini file
+
+def replace_and_escape(value):
+    if isinstance(value, bool):
+        return 'True' if value else 'False'         # Replace boolean values with string
+    elif isinstance(value, (int, float)):
+        return str(value)                           # Convert int and float to string
+    elif isinstance(value, str):
+        if any(c in value for c in ESCAPED_CHARACTERS):    # Escape special characters
+            return f'"{value}"'
+        return value
+    else:
+        raise ValueError(f"Unsupported value type: {type(value)}")
+
+# Remove the quotes added by replace_and_escape, a text that only happens to be quoted is kept as is
+def unescape(value):
+    if len(value) >= 2 and value[0] == value[-1] == '"' and any(c in value[1:-1] for c in ESCAPED_CHARACTERS):
+        return value[1:-1]
+    return value
+
+def ensure_ini_type(value):
+    try:
+        return int(value)
+    except ValueError:
+        if value.lstrip('-').replace('.', '', 1).isdigit():
+            return float(value)                     # Plain decimal numbers only, e.g. the confidence threshold
+        elif value == 'True' or value == 'False': # ugly, but works
+            return value == 'True'
+        else:
+            return value
+
+### Utility Functions Section End ###
+
+# Find the micro:bit and start the writer of its port, and the watcher that reconnects it when it is unplugged
+# Returns False if no micro:bit is found, unless wait is set: the writer then connects once the micro:bit is plugged in
+def connect_microbit(wait=False):
+    global ser, serial_writer, serial_watcher
+    # Stop the writer of the previous connection
+    disconnect_microbit()
+    ser = find_port(PID_MICROBIT, VID_MICROBIT, BAUD_RATE)
+    if ser is None:
+        if not wait:
+            logging.error("無法找到目標設備，請確保micro:bit已連接到電腦或試一個新的micro:bit。")
+            return False
+        logging.info("找不到micro:bit，將在插入後自動連接")
+    else:
+        # Terminate the connection and re-enstablish it
+        logging.info("正在重新連接到目標設備……")
+        ser.close()
+        ser.open()
+    serial_writer = create_serial_writer(ser)
+    serial_writer.start()
+    serial_writer.send('0'.encode())
+    serial_watcher = SerialWatcher(serial_writer, PID_MICROBIT, VID_MICROBIT, BAUD_RATE,
+                                   get_option('SERIAL', 'watch_interval'), get_option('SERIAL', 'reconnect_max'))
+    serial_watcher.start()
+    if ser is not None:
+        logging.info("已連接到目標設備")
+    return True
+
+# Stop the writer once the queued commands are written, and forget the port
+def disconnect_microbit():
+    global ser, serial_writer, serial_watcher
+    if serial_watcher is not None:
+        serial_watcher.stop()
+        serial_watcher = None
+    if serial_writer is not None:
+        serial_writer.stop()
+        serial_writer = None
+    ser = None
+
+class DetectionEngine:
+    """
+    Runs the capture -> inference -> rule -> serial pipeline, without any Qt dependency.
+
+    The window runs it in a QThread through its DetectionWorker, the command line calls it
+    directly. It reports back through the optional callbacks, status(type 1 count, type 2 count, FPS),
+    command(text, label color), latency(stage percentiles) and error(message). Stopping is
+    cooperative: the loop checks `end_capture` once per frame.
+
+    Every source camera has its own capture thread, and the newest frames of all the
+    sources go through the model in one batched call per frame, or one call per source for the
+    exported models (see supports_batch).
+
+    Each stage of the loop is timed into `latency`, the percentiles are reported with the
+    status together with the serial and end-to-end (capture to serial write) latencies.
+    """
+    def __init__(self, sources=(CAM_INDEX,), status=None, command=None, latency=None, error=None):
+        ignore = lambda *args: None
+        self.report_status = status or ignore       # Every STATUS_INTERVAL seconds
+        self.report_command = command or ignore     # At most every LABEL_INTERVAL seconds
+        self.report_latency = latency or ignore     # stage -> (p50, p95, p99) in seconds, every STATUS_INTERVAL seconds
+        self.report_error = error or ignore
+        self.sources = list(sources)
+        self.fps = 0.0
+        self.frame_index = 0
+        self.pending_command = None
+        self.last_label = 0.0
+        self.captured_at = None
+        self.previewed = False  # A preview window was shown, headless OpenCV builds cannot even close windows
+        self.latency = LatencyStats(('capture', 'inference', 'counting', 'rules', 'preview'))
+
+    def latency_summary(self):
+        return {**self.latency.summary(), **(serial_writer.latency.summary() if serial_writer is not None else {})}
+
+    def send_command(self, command, counters, label_counts, color, source=None):
+        data = prepare_and_send_command_text(command, counters, label_counts, self.fps, self.frame_index, self.captured_at, source)
+        # The label is updated later by flush_command, so a burst of commands costs one UI update
+        self.pending_command = (data.decode(errors='replace'), color)
+
+    def flush_command(self, now):
+        if self.pending_command is not None and now - self.last_label >= LABEL_INTERVAL:
+            self.report_command(*self.pending_command)
+            self.pending_command = None
+            self.last_label = now
+
+    def open_grabbers(self):
+        """Open the source cameras and start their capture threads, None if a camera cannot be opened"""
+        caps = []
+        for camera in self.sources:
+            cap = open_capture(camera)
+            if not cap.isOpened():
+                logging.error("無法打開選擇的攝像頭設備：{}".format(camera_name(camera)))
+                self.report_error("無法打開選擇的攝像頭設備")
+                for opened in caps:
+                    opened.release()
+                return None
+            caps.append(cap)
+
+        # Capture each source in a separate thread, so the loop below always gets the newest frames
+        grabbers = [FrameGrabber(cap) for cap in caps]
+        for grabber in grabbers:
+            grabber.start()
+        return grabbers
+
+    def detect(self):
+        grabbers = self.open_grabbers()
+        if grabbers is None:
+            return
+        # Sources without motion reuse their last results instead of going through the model
+        gates = [create_motion_gate() for _ in self.sources]
+        try:
+            self.process(grabbers, gates)
+        finally:
+            # Stop the capture threads before releasing the captures, also when the loop failed, so the cameras can be opened again
+            for camera, grabber, gate in zip(self.sources, grabbers, gates):
+                grabber.stop()
+                logging.info("{}：已處理幀數：{}，已丟棄幀數：{}，幀緩衝分配次數：{}，推理幀數：{}，靜止略過幀數：{}".format(
+                    camera_name(camera), grabber.processed, grabber.dropped, grabber.allocations, gate.inferred, gate.skipped))
+                grabber.cap.release()
+
+            # Close windows
+            if self.previewed:
+                cv2.destroyAllWindows()
+
+    def process(self, grabbers, gates):
+        """Run the detection loop on the frames of the started grabbers until end_capture is set"""
+        logging.info("開始收集數據")
+
+        # Frames that are not displayed are neither drawn nor shown
+        preview_mode = str(get_option('DISPLAY', 'preview_mode')).lower()
+        preview_interval = 1.0 / max(get_option('DISPLAY', 'preview_fps'), 1) if preview_mode == 'capped' else 0.0
+        overlay = get_option('DISPLAY', 'overlay')
+        last_preview = 0.0
+        summary = {}
+        # Only the serial counters and latencies of this run are reported
+        serial_writer.reset_statistics()
+        count_filter = create_count_filter()
+        crop, zones = get_crop(), get_zones()
+        offset = crop[:2] if crop is not None else (0, 0)
+        rule_set = create_rule_set(self.sources, zones)
+        table_classes = rule_set.classes(len(model.names))
+        batched = supports_batch(model)
+        last_results = [None] * len(self.sources)
+        raw_counts = None
+        old1, old2 = 0, 0
+        type1Counter, type2Counter = 0, 0
+        frames, last_status = 0, time.perf_counter()
+        # The cameras may take a while to deliver their first frame after opening
+        timeout = FIRST_FRAME_TIMEOUT
+
+        while not end_capture:
+            started = time.perf_counter()
+            frames_read = [grabber.read(timeout=timeout) for grabber in grabbers]
+            if not all(ret for ret, _ in frames_read):
+                if any(grabber.exhausted for grabber in grabbers):
+                    logging.info("已讀取所有錄製的幀")
+                    break
+                logging.error("讀取幀時出錯！")
+                self.report_error("讀取幀時出錯！")
+                break
+            timeout = TIMEOUT
+            batch = [frame for _, frame in frames_read]
+            # The end-to-end latency starts at the oldest frame of the batch
+            self.captured_at = min(grabber.captured_at for grabber in grabbers)
+            stage_start = time.perf_counter()
+            self.latency.record('capture', stage_start - started)
+
+            preview = preview_mode != 'off' and time.perf_counter() - last_preview >= preview_interval
+
+            # Ultralytics takes BGR numpy arrays as they come from OpenCV, so the frame is used as is
+            # Take the rule once per frame, the GUI thread swaps in a new one whenever a widget changes
+            current_rule = rule
+            # Only the cropped region (a view, not a copy) is checked for motion and goes through the model
+            inputs = [frame[crop[1]:crop[3], crop[0]:crop[2]] for frame in batch] if crop is not None else batch
+            now = time.perf_counter()
+            active = [source for source, frame in enumerate(inputs) if gates[source].needs_inference(frame, now)]
+            if active:
+                predict_args = get_predict_args(current_rule, table_classes)
+                if batched:
+                    results = model([inputs[source] for source in active], **predict_args)
+                else:
+                    results = [model(inputs[source], **predict_args)[0] for source in active]
+                for source, result in zip(active, results):
+                    last_results[source] = result
+                now = time.perf_counter()
+                self.latency.record('inference', now - stage_start)
+                stage_start = now
+            if active or preview or raw_counts is None:
+                raw_counts = get_label_counts(last_results, batch if preview else None, zones, offset)
+
+            # Smooth the counts over time before checking the rule
+            now = time.perf_counter()
+            label_counts = count_filter.update(raw_counts, now)
+            self.latency.record('counting', now - stage_start)
+            stage_start = now
+            type1Counter, type2Counter = count_of(label_counts, current_rule.class1), count_of(label_counts, current_rule.class2)
+
+            if type1Counter != old1 or type2Counter != old2:
+                # Only update if either of the counters have changed
+                if counter_logic(current_rule, type1Counter, type2Counter):
+                    # Send the command to the micro:bit
+                    self.send_command(current_rule.command, (type1Counter, type2Counter), label_counts, "green")
+                elif current_rule.has_negate:
+                    #Get the command of the else condition
+                    self.send_command(current_rule.command_else, (type1Counter, type2Counter), label_counts, "red")
+                old1, old2 = type1Counter, type2Counter
+
+            # Rules of the table, only the ones whose classes changed are evaluated
+            for table_rule in rule_set.evaluate(label_counts):
+                first, second = table_rule.counters
+                self.send_command(table_rule.command, (count_of(label_counts, first), count_of(label_counts, second)), label_counts, "blue",
+                                  table_rule.name)
+
+            # Report the counters, the frame rate and the latencies to the UI every STATUS_INTERVAL seconds
+            frames += 1
+            self.frame_index += 1
+            now = time.perf_counter()
+            self.latency.record('rules', now - stage_start)
+            self.flush_command(now)
+            if now - last_status >= STATUS_INTERVAL:
+                self.fps = frames / (now - last_status)
+                self.report_status(type1Counter, type2Counter, self.fps)
+                summary = self.latency_summary()
+                self.report_latency(summary)
+                frames, last_status = 0, now
+
+            if preview:
+                last_preview = time.perf_counter()
+                self.previewed = True
+                for camera, frame in zip(self.sources, batch):
+                    draw_regions(frame, crop, zones)
+                    if overlay:
+                        draw_latency(frame, self.fps, summary)
+                    cv2.imshow('Video captured using {} ({})'.format(model.model_name, camera_name(camera)), frame)
+
+                # Break the loop on 'q' key press
+                key = cv2.waitKey(1)
+                self.latency.record('preview', time.perf_counter() - last_preview)
+                if key & 0xFF == ord('q'):
+                    break
+
+        logging.info("停止收集數據")
+
+        # Show the last command even if it was throttled
+        if self.pending_command is not None:
+            self.report_command(*self.pending_command)
+
+        writer, watcher = serial_writer, serial_watcher
+        if writer is not None:
+            writer.send('0'.encode())
+            # The statistics include the last commands once they are written
+            writer.flush()
+            logging.info("已發送指令：{}，已發送位元組：{}，已丟棄指令：{}，略過重複指令：{}，最大佇列深度：{}，平均發送延遲：{:.1f}ms".format(
+                writer.sent, writer.bytes_sent, writer.dropped, writer.repeated, writer.max_queue_depth, writer.average_latency * 1000))
+        if watcher is not None and watcher.reconnections:
+            logging.info("micro:bit重新連接次數：{}".format(watcher.reconnections))
+        for line in format_latency(self.latency_summary()):
+            logging.info("延遲：{}".format(line))
+
+### Main Function ###
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the detection without the window, with the rule and the options of the configuration file")
+    parser.add_argument('--config', default=CONFIG_FILE, help="configuration file, config.ini or a JSON file exported from the window")
+    parser.add_argument('--model', help="model file, defaults to the model of the configuration file")
+    parser.add_argument('--no-preview', action='store_true', help="do not open the preview window, for unattended installations")
+    return parser.parse_args()
+
+def main():
+    global model, inference_args, rule, end_capture
+    args = parse_args()
+
+    try:
+        if args.config.endswith('.json'):
+            blank_config()
+            read_config_json(args.config)
+        else:
+            read_config(args.config)
+    except (OSError, ValueError, configparser.Error) as e:
+        logging.error("無法讀取配置文件：{}".format(e))
+        return 1
+    if args.no_preview:
+        config['DISPLAY']['preview_mode'] = 'off'
+
+    model_file = args.model or config['SETTINGS']['yolo_model']
+    if not model_file:
+        logging.error("沒有選擇模型")
+        return 1
+    logging.info("正在嘗試加載模型……")
+    try:
+        model, inference_args = prepare_model(model_file, get_model_key(model_file), lambda state: logging.info("模型{}".format(state)))
+    except Exception as e:
+        logging.error(f"加載模型時出錯：{e}")
+        return 1
+    settings = get_config_settings()
+    rule = build_rule(settings)
+
+    # Unattended, the micro:bit may be plugged in after the start
+    connect_microbit(wait=True)
+
+    # Stop cleanly on Ctrl+C and when the service is stopped
+    def stop(*args):
+        global end_capture
+        end_capture = True
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    detector = DetectionEngine(get_sources(camera_index(str(settings['camera']))),
+                               command=lambda text, color: logging.info("已發送指令：{}".format(text)))
+    end_capture = False
+    detector.detect()
+    disconnect_microbit()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,7 +16,7 @@ from PySide6.QtGui import (QBrush, QColor, QConicalGradient, QCursor,
     QImage, QKeySequence, QLinearGradient, QPainter,
     QPalette, QPixmap, QRadialGradient, QTransform)
 from PySide6.QtWidgets import (QApplication, QCheckBox, QComboBox, QDialog,
-    QFormLayout, QFrame, QGridLayout, QHBoxLayout,
+    QDoubleSpinBox, QFormLayout, QFrame, QGridLayout, QHBoxLayout,
     QLabel, QLayout, QLineEdit, QPushButton,
     QSizePolicy, QSpacerItem, QSpinBox, QTextBrowser,
     QWidget)
@@ -25,7 +25,7 @@ class Ui_MainDialog(object):
     def setupUi(self, MainDialog):
         if not MainDialog.objectName():
             MainDialog.setObjectName(u"MainDialog")
-        MainDialog.resize(444, 395)
+        MainDialog.resize(444, 455)
         sizePolicy = QSizePolicy(QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Preferred)
         sizePolicy.setHorizontalStretch(15)
         sizePolicy.setVerticalStretch(0)
@@ -34,7 +34,7 @@ class Ui_MainDialog(object):
         MainDialog.setLocale(QLocale(QLocale.Cantonese, QLocale.HongKong))
         self.gridLayoutWidget = QWidget(MainDialog)
         self.gridLayoutWidget.setObjectName(u"gridLayoutWidget")
-        self.gridLayoutWidget.setGeometry(QRect(0, 10, 441, 381))
+        self.gridLayoutWidget.setGeometry(QRect(0, 10, 441, 441))
         self.gridLayout = QGridLayout(self.gridLayoutWidget)
         self.gridLayout.setObjectName(u"gridLayout")
         self.gridLayout.setSizeConstraint(QLayout.SizeConstraint.SetDefaultConstraint)
@@ -120,6 +120,30 @@ class Ui_MainDialog(object):
 
         self.modelFormLayout.setWidget(0, QFormLayout.LabelRole, self.loadModelButton)
 
+        self.confLabel = QLabel(self.gridLayoutWidget)
+        self.confLabel.setObjectName(u"confLabel")
+
+        self.modelFormLayout.setWidget(1, QFormLayout.LabelRole, self.confLabel)
+
+        self.filterLayout = QHBoxLayout()
+        self.filterLayout.setObjectName(u"filterLayout")
+        self.confSpinBox = QDoubleSpinBox(self.gridLayoutWidget)
+        self.confSpinBox.setObjectName(u"confSpinBox")
+        self.confSpinBox.setMinimum(0.010000000000000)
+        self.confSpinBox.setMaximum(1.000000000000000)
+        self.confSpinBox.setSingleStep(0.050000000000000)
+        self.confSpinBox.setValue(0.500000000000000)
+
+        self.filterLayout.addWidget(self.confSpinBox)
+
+        self.selectedOnlyCheckBox = QCheckBox(self.gridLayoutWidget)
+        self.selectedOnlyCheckBox.setObjectName(u"selectedOnlyCheckBox")
+
+        self.filterLayout.addWidget(self.selectedOnlyCheckBox)
+
+
+        self.modelFormLayout.setLayout(1, QFormLayout.FieldRole, self.filterLayout)
+
         self.startButton = QPushButton(self.gridLayoutWidget)
         self.startButton.setObjectName(u"startButton")
 
@@ -145,6 +169,28 @@ class Ui_MainDialog(object):
 
         self.modelFormLayout.setWidget(0, QFormLayout.FieldRole, self.modelLabel)
 
+        self.cameraLabel = QLabel(self.gridLayoutWidget)
+        self.cameraLabel.setObjectName(u"cameraLabel")
+
+        self.modelFormLayout.setWidget(3, QFormLayout.LabelRole, self.cameraLabel)
+
+        self.cameraLayout = QHBoxLayout()
+        self.cameraLayout.setObjectName(u"cameraLayout")
+        self.cameraComboBox = QComboBox(self.gridLayoutWidget)
+        self.cameraComboBox.setObjectName(u"cameraComboBox")
+        sizePolicy2.setHeightForWidth(self.cameraComboBox.sizePolicy().hasHeightForWidth())
+        self.cameraComboBox.setSizePolicy(sizePolicy2)
+
+        self.cameraLayout.addWidget(self.cameraComboBox)
+
+        self.refreshCameraButton = QPushButton(self.gridLayoutWidget)
+        self.refreshCameraButton.setObjectName(u"refreshCameraButton")
+
+        self.cameraLayout.addWidget(self.refreshCameraButton)
+
+
+        self.modelFormLayout.setLayout(3, QFormLayout.FieldRole, self.cameraLayout)
+
 
         self.gridLayout.addLayout(self.modelFormLayout, 0, 0, 1, 5)
 
@@ -265,7 +311,14 @@ class Ui_MainDialog(object):
         self.resetButton = QPushButton(self.gridLayoutWidget)
         self.resetButton.setObjectName(u"resetButton")
 
-        self.gridLayout.addWidget(self.resetButton, 7, 2, 1, 2)
+        self.gridLayout.addWidget(self.resetButton, 7, 2, 1, 1)
+
+        self.statsLabel = QLabel(self.gridLayoutWidget)
+        self.statsLabel.setObjectName(u"statsLabel")
+        sizePolicy1.setHeightForWidth(self.statsLabel.sizePolicy().hasHeightForWidth())
+        self.statsLabel.setSizePolicy(sizePolicy1)
+
+        self.gridLayout.addWidget(self.statsLabel, 7, 3, 1, 1)
 
         self.gridLayout.setColumnStretch(1, 10)
 
@@ -293,10 +346,20 @@ class Ui_MainDialog(object):
         self.relationComboBox.setItemText(5, QCoreApplication.translate("MainDialog", u"\u5c0f\u65bc\u6216\u7b49\u65bc", None))
 
         self.loadModelButton.setText(QCoreApplication.translate("MainDialog", u"\u9078\u64c7\u6a21\u578b", None))
+        self.confLabel.setText(QCoreApplication.translate("MainDialog", u"\u4fe1\u5fc3\u5ea6\u9580\u6abb", None))
+#if QT_CONFIG(tooltip)
+        self.selectedOnlyCheckBox.setToolTip(QCoreApplication.translate("MainDialog", u"\u6a21\u578b\u53ea\u5075\u6e2c\u689d\u4ef6\u4e2d\u6240\u9078\u7684\u7269\u54c1\u985e\u5225\uff0c\u53ef\u4ee5\u52a0\u5feb\u5075\u6e2c\u901f\u5ea6", None))
+#endif // QT_CONFIG(tooltip)
+        self.selectedOnlyCheckBox.setText(QCoreApplication.translate("MainDialog", u"\u53ea\u5075\u6e2c\u6240\u9078\u985e\u5225", None))
         self.startButton.setText(QCoreApplication.translate("MainDialog", u"\u958b\u59cb", None))
         self.stopButton.setText(QCoreApplication.translate("MainDialog", u"\u66ab\u505c", None))
         self.connectButton.setText(QCoreApplication.translate("MainDialog", u"\u9023\u63a5\u5230micro:bit", None))
         self.modelLabel.setText(QCoreApplication.translate("MainDialog", u"\u672a\u9078\u64c7\u6a21\u578b", None))
+        self.cameraLabel.setText(QCoreApplication.translate("MainDialog", u"\u651d\u50cf\u982d", None))
+#if QT_CONFIG(tooltip)
+        self.refreshCameraButton.setToolTip(QCoreApplication.translate("MainDialog", u"\u91cd\u65b0\u641c\u5c0b\u9023\u63a5\u5230\u96fb\u8166\u7684\u651d\u50cf\u982d", None))
+#endif // QT_CONFIG(tooltip)
+        self.refreshCameraButton.setText(QCoreApplication.translate("MainDialog", u"\u91cd\u65b0\u641c\u5c0b", None))
         self.labelSubTitle.setText(QCoreApplication.translate("MainDialog", u"\u8f38\u51fa\u908f\u8f2f", None))
         self.hasNegate.setText(QCoreApplication.translate("MainDialog", u"\u4f7f\u7528", None))
         self.label.setText(QCoreApplication.translate("MainDialog", u"\u7576\u6a21\u578b\u8b58\u5225\u5230", None))
@@ -331,5 +394,9 @@ class Ui_MainDialog(object):
         self.resetButton.setToolTip(QCoreApplication.translate("MainDialog", u"<html><head/><body><p>\u9664\u4e86\u4ecb\u9762\u4e0a\u7684\u8a2d\u5b9a\u6703\u88ab\u91cd\u8a2d\u5916\uff0c<span style=\" font-weight:700;\">\u4efb\u4f55\u900f\u904e&quot;\u5132\u5b58\u8a2d\u5b9a&quot;\u6309\u9215\u5132\u5b58\u7684\u8a2d\u5b9a\u90fd\u6703\u88ab\u6e05\u9664</span></p></body></html>", None))
 #endif // QT_CONFIG(tooltip)
         self.resetButton.setText(QCoreApplication.translate("MainDialog", u"\u91cd\u7f6e\u8a2d\u5b9a", None))
+#if QT_CONFIG(tooltip)
+        self.statsLabel.setToolTip(QCoreApplication.translate("MainDialog", u"\u5404\u968e\u6bb5\u5ef6\u9072\uff08p50/p95/p99\uff09", None))
+#endif // QT_CONFIG(tooltip)
+        self.statsLabel.setText(QCoreApplication.translate("MainDialog", u"\u5ef6\u9072\uff1a-", None))
     # retranslateUi
 
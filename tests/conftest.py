@@ -0,0 +1,7 @@
+# Created and maintained by: Minedient
+# GPL-3.0 License
+
+# The modules live at the root of the repository, next to this directory
+import sys, os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,46 @@
+# Created and maintained by: Minedient
+# GPL-3.0 License
+
+import numpy as np
+
+import engine
+
+COUNT_INDICES = {'person': 0, 'chair': 1, 'door:person': 2, 'door:chair': 3}
+LABEL_COUNTS = np.array([3, 1, 2, 0], dtype=np.int64)
+
+def render(text, counters=(0, 0), **kwargs):
+    return engine.CommandTemplate(text, COUNT_INDICES).render(counters, LABEL_COUNTS, **kwargs)
+
+def test_literal_text():
+    assert render('go left') == b'go left'
+    assert render('') == b''
+
+def test_counters():
+    assert render('P%1C%2', (4, 7)) == b'P4C7'
+
+def test_class_counts():
+    assert render('%{person}/%{chair}') == b'3/1'
+    assert render('D%{door:person}') == b'D2'
+    # Unknown classes count as 0
+    assert render('%{dog}') == b'0'
+
+def test_escaped_percent():
+    assert render('100%%') == b'100%'
+    assert render('%%1') == b'%1'
+
+def test_frame_rate_and_index():
+    assert render('%f fps #%n', fps=12.34, frame_index=42) == b'12.3 fps #42'
+
+def test_counts_only_templates_are_cached():
+    template = engine.CommandTemplate('P%1 %{chair}', COUNT_INDICES)
+    assert template.counts_only
+    assert template.render((2, 0), LABEL_COUNTS) == b'P2 1'
+    assert template.render((2, 0), LABEL_COUNTS) is template.render((2, 0), LABEL_COUNTS)
+    assert template.render((5, 0), LABEL_COUNTS) == b'P5 1'
+    assert not engine.CommandTemplate('%n', COUNT_INDICES).counts_only
+
+def test_cache_is_bounded():
+    template = engine.CommandTemplate('%1', COUNT_INDICES)
+    for count in range(template.CACHE_SIZE * 2):
+        assert template.render((count, 0), LABEL_COUNTS) == str(count).encode()
+    assert len(template._cache) == template.CACHE_SIZE
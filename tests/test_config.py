@@ -0,0 +1,45 @@
+# Created and maintained by: Minedient
+# GPL-3.0 License
+
+import configparser
+import io
+
+import pytest
+
+import engine
+
+@pytest.fixture
+def config(monkeypatch):
+    config = configparser.ConfigParser(interpolation=None)
+    config['SETTINGS'] = {}
+    monkeypatch.setattr(engine, 'config', config)
+    return config
+
+# Save the value as the window does, then read the file back
+def round_trip(config, key, value):
+    config['SETTINGS'][key] = engine.replace_and_escape(value)
+    text = io.StringIO()
+    config.write(text)
+    config.clear()
+    config.read_string(text.getvalue())
+    return engine.get_setting(key)
+
+@pytest.mark.parametrize('value', ['A', 'go left', '01', '2.50', '-3', 'True', 'a=b', 'x;y', '50%', ''])
+def test_command_texts_are_read_as_typed(config, value):
+    assert round_trip(config, 'command_text', value) == value
+
+@pytest.mark.parametrize('key, value', [('first_number', 3), ('confidence', 0.25), ('has_negate', True), ('camera', 'video1')])
+def test_widget_values_keep_their_type(config, key, value):
+    assert round_trip(config, key, value) == value
+
+def test_missing_settings_use_the_defaults(config):
+    assert engine.get_setting('command_text') == ''
+    assert engine.get_setting('confidence') == 0.5
+    assert engine.get_setting('selected_only') is False
+
+def test_unescape():
+    assert engine.unescape('"go left"') == 'go left'
+    # Quotes that replace_and_escape did not add are part of the text
+    assert engine.unescape('"A"') == '"A"'
+    assert engine.unescape('"') == '"'
+    assert engine.unescape('') == ''
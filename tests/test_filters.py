@@ -0,0 +1,35 @@
+# Created and maintained by: Minedient
+# GPL-3.0 License
+
+import numpy as np
+
+import engine
+
+def run(count_filter, values, times=None):
+    times = times or range(len(values))
+    return [int(count_filter.update(np.array([value], dtype=np.int64), now)[0]) for value, now in zip(values, times)]
+
+def test_pass_through():
+    assert run(engine.CountFilter(), [1, 5, 2]) == [1, 5, 2]
+
+def test_median_over_window():
+    assert run(engine.MedianFilter(3), [1, 5, 2, 2, 9]) == [1, 3, 2, 2, 2]
+
+def test_mode_ties_go_to_newest():
+    assert run(engine.ModeFilter(3), [1, 2, 1, 3, 3]) == [1, 2, 1, 3, 3]
+    assert run(engine.ModeFilter(5), [4, 4, 0, 4, 0]) == [4, 4, 4, 4, 4]
+
+def test_ema():
+    assert run(engine.EmaFilter(0.5), [0, 4, 4]) == [0, 2, 3]
+    # alpha is clamped to [0, 1]
+    assert run(engine.EmaFilter(2.0), [0, 4]) == [0, 4]
+
+def test_hysteresis_holds_new_counts():
+    times = [0.0, 0.5, 1.0, 1.6, 2.0, 2.2, 3.0]
+    assert run(engine.HysteresisFilter(1.0), [0, 3, 3, 3, 5, 3, 3], times) == [0, 0, 0, 3, 3, 3, 3]
+
+def test_filters_are_per_class():
+    median = engine.MedianFilter(3)
+    for value in ([1, 0], [1, 9], [1, 9]):
+        filtered = median.update(np.array(value, dtype=np.int64), 0.0)
+    assert filtered.tolist() == [1, 9]
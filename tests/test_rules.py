@@ -0,0 +1,72 @@
+# Created and maintained by: Minedient
+# GPL-3.0 License
+
+import types
+
+import numpy as np
+import pytest
+
+import engine
+
+# Three classes counted over all the sources, then in the door zone
+COUNT_INDICES = {'person': 0, 'chair': 1, 'cat': 2, 'door:person': 3, 'door:chair': 4, 'door:cat': 5}
+
+def counts(*values):
+    return np.array(values + (0,) * (len(COUNT_INDICES) - len(values)), dtype=np.int64)
+
+def test_parse_rule_and_binds_tighter_than_or():
+    table_rule = engine.parse_rule('r', 'person>0 or chair>0 and cat>0 -> A', COUNT_INDICES)
+    assert len(table_rule.groups) == 2
+    assert engine.rule_holds(table_rule, counts(1, 0, 0))
+    assert not engine.rule_holds(table_rule, counts(0, 1, 0))
+    assert engine.rule_holds(table_rule, counts(0, 1, 1))
+
+def test_parse_rule_operators():
+    for text, holds, fails in [('person>=2', 2, 1), ('person==2', 2, 3), ('person!=2', 1, 2),
+                               ('person<2', 1, 2), ('person<=2', 2, 3), ('person>2', 3, 2)]:
+        table_rule = engine.parse_rule('r', text + ' -> A', COUNT_INDICES)
+        assert engine.rule_holds(table_rule, counts(holds)), text
+        assert not engine.rule_holds(table_rule, counts(fails)), text
+
+def test_parse_rule_inputs_and_counters():
+    table_rule = engine.parse_rule('r', 'door:person>0 and chair==0 and door:person<5 -> P%1 C%2', COUNT_INDICES)
+    assert table_rule.inputs == (3, 1)
+    assert table_rule.counters == (3, 1)
+    assert table_rule.command.render((4, 0), counts()) == b'P4 C0'
+    # With a single class, %2 is the same count as %1
+    assert engine.parse_rule('r', 'cat>0 -> %1%2', COUNT_INDICES).counters == (2, 2)
+
+@pytest.mark.parametrize('text', ['person>0', 'person>>0 -> A', 'person>x -> A', 'dog>0 -> A', 'door:dog>0 -> A'])
+def test_parse_rule_errors(text):
+    with pytest.raises(ValueError):
+        engine.parse_rule('r', text, COUNT_INDICES)
+
+def test_rule_set_only_evaluates_changed_inputs():
+    people = engine.parse_rule('people', 'person>0 -> P', COUNT_INDICES)
+    empty = engine.parse_rule('empty', 'chair==0 -> E', COUNT_INDICES)
+    rule_set = engine.RuleSet([people, empty], len(COUNT_INDICES))
+
+    # chair==0 holds but the chair count did not change
+    assert rule_set.evaluate(counts(1)) == [people]
+    assert rule_set.evaluate(counts(1)) == []
+    assert rule_set.evaluate(counts(2, 1)) == [people]
+    assert rule_set.evaluate(counts(2, 0)) == [empty]
+    # The count changed but the condition does not hold
+    assert rule_set.evaluate(counts(0, 0)) == []
+
+def test_rule_set_classes():
+    rule_set = engine.RuleSet([engine.parse_rule('r', 'door:chair>0 or cat>0 -> A', COUNT_INDICES)], len(COUNT_INDICES))
+    assert rule_set.classes(3) == {1, 2}
+    assert engine.RuleSet([], len(COUNT_INDICES)).classes(3) == set()
+
+def test_predict_args_add_table_classes_to_selected_classes():
+    selected = types.SimpleNamespace(conf=0.5, classes=[0])
+    assert engine.get_predict_args(selected, frozenset({2}))['classes'] == [0, 2]
+    everything = types.SimpleNamespace(conf=0.5, classes=None)
+    assert engine.get_predict_args(everything, frozenset({2}))['classes'] is None
+
+def test_only_pytorch_models_take_a_batch():
+    assert engine.supports_batch(types.SimpleNamespace(model_name='models/yolo11n.pt'))
+    assert not engine.supports_batch(types.SimpleNamespace(model_name='models/yolo11n.onnx'))
+    assert not engine.supports_batch(types.SimpleNamespace(model_name='models/yolo11n_openvino_model'))
+    assert not engine.supports_batch(object())
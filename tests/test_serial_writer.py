@@ -0,0 +1,186 @@
+# Created and maintained by: Minedient
+# GPL-3.0 License
+
+import time
+
+import pytest
+
+import engine
+
+class FakePort:
+    """
+    Serial port keeping the written bytes and the time of each write, the first `failures` writes raise
+    like an unplugged micro:bit.
+    """
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.written = []
+        self.times = []
+        self.closed = False
+
+    def write(self, data):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("device disconnected")
+        self.written.append(data)
+        self.times.append(time.perf_counter())
+        return len(data)
+
+    def close(self):
+        self.closed = True
+
+# Write everything queued so far: the writer thread stops once its queue is empty
+def flush(writer):
+    writer.start()
+    writer.stop()
+
+def test_commands_are_written_in_order():
+    port = FakePort()
+    writer = engine.SerialWriter(port, coalesce=False)
+    for data in (b'a', b'b', b'c'):
+        writer.send(data)
+    flush(writer)
+    assert port.written == [b'a', b'b', b'c']
+    assert (writer.sent, writer.bytes_sent, writer.dropped) == (3, 3, 0)
+
+def test_coalesce_keeps_the_latest_command():
+    port = FakePort()
+    writer = engine.SerialWriter(port, coalesce=True)
+    for data in (b'a', b'b', b'c'):
+        writer.send(data)
+    assert writer.queue_depth == 1
+    flush(writer)
+    assert port.written == [b'c']
+    assert writer.dropped == 2
+
+def test_full_queue_drops_the_oldest_command():
+    port = FakePort()
+    writer = engine.SerialWriter(port, queue_size=2, coalesce=False)
+    for data in (b'a', b'b', b'c'):
+        writer.send(data)
+    assert writer.queue_depth == writer.max_queue_depth == 2
+    flush(writer)
+    assert port.written == [b'b', b'c']
+    assert writer.dropped == 1
+
+def test_flush_waits_until_the_commands_are_written():
+    port = FakePort()
+    writer = engine.SerialWriter(port, coalesce=False, max_rate=50)
+    writer.start()
+    for data in (b'a', b'b', b'c'):
+        writer.send(data)
+    assert writer.flush()
+    assert port.written == [b'a', b'b', b'c']
+    assert writer.is_alive()
+    writer.stop()
+
+def test_reset_statistics():
+    port = FakePort()
+    writer = engine.SerialWriter(port, queue_size=2, coalesce=False)
+    for data in (b'a', b'b', b'c'):
+        writer.send(data)
+    flush(writer)
+    writer.reset_statistics()
+    assert (writer.sent, writer.bytes_sent, writer.dropped, writer.max_queue_depth) == (0, 0, 0, 0)
+    assert writer.latency.summary() == {}
+
+def test_framing():
+    for framing, expected in [('raw', b'a\nb'), ('newline', b'ab\n'), ('length', b'\x03a\nb')]:
+        port = FakePort()
+        writer = engine.SerialWriter(port, framing=framing)
+        writer.send(b'a\nb')
+        flush(writer)
+        assert port.written == [expected], framing
+
+def test_too_long_command_is_not_written():
+    port = FakePort()
+    writer = engine.SerialWriter(port, framing='length')
+    writer.send(b'x' * 256)
+    flush(writer)
+    assert port.written == []
+    assert writer.errors == 1
+
+def test_repeated_commands_are_skipped():
+    port = FakePort()
+    writer = engine.SerialWriter(port, coalesce=False, repeat_interval=60)
+    writer.send(b'A')
+    writer.send(b'A')
+    writer.send(b'B')
+    writer.send(b'A')
+    flush(writer)
+    assert port.written == [b'A', b'B', b'A']
+    assert writer.repeated == 1
+
+# The limit only holds while running, stop() writes whatever is left without waiting
+def test_rate_limit():
+    port = FakePort()
+    writer = engine.SerialWriter(port, coalesce=False, max_rate=20)
+    writer.start()
+    for data in (b'a', b'b', b'c'):
+        writer.send(data)
+    deadline = time.perf_counter() + 2
+    while len(port.written) < 3 and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    writer.stop()
+    assert port.written == [b'a', b'b', b'c']
+    assert all(later - earlier >= 0.045 for earlier, later in zip(port.times, port.times[1:]))
+
+def test_coalesce_keeps_the_latest_command_of_each_rule():
+    port = FakePort()
+    writer = engine.SerialWriter(port, coalesce=True)
+    writer.send(b'C1')
+    writer.send(b'C2')
+    writer.send(b'P1', source='crowd')
+    writer.send(b'P2', source='crowd')
+    writer.send(b'Z', source='z')
+    flush(writer)
+    assert port.written == [b'C2', b'P2', b'Z']
+    assert (writer.sent, writer.dropped) == (3, 2)
+
+def test_repeated_commands_are_skipped_per_rule():
+    port = FakePort()
+    writer = engine.SerialWriter(port, coalesce=False, repeat_interval=60)
+    writer.send(b'A')
+    writer.send(b'A')
+    writer.send(b'A', source='other')
+    writer.send(b'B')
+    flush(writer)
+    assert port.written == [b'A', b'A', b'B']
+    assert writer.repeated == 1
+
+@pytest.mark.parametrize('coalesce', [True, False])
+@pytest.mark.parametrize('policy, expected', [
+    ('drop', []),
+    ('latest', [b'b', b'z']),
+    ('buffer', [b'a', b'b', b'z'])
+])
+def test_offline_policy(policy, expected, coalesce):
+    writer = engine.SerialWriter(None, coalesce=coalesce, offline_policy=policy)
+    writer.send(b'a')
+    writer.send(b'b')
+    writer.send(b'z', source='z')
+    port = FakePort()
+    writer.attach(port)
+    flush(writer)
+    assert port.written == expected
+
+def test_unknown_offline_policy_falls_back_to_latest():
+    assert engine.SerialWriter(None, offline_policy='keep').offline_policy == 'latest'
+
+@pytest.mark.parametrize('policy, expected', [('drop', []), ('latest', [b'b']), ('buffer', [b'a', b'b'])])
+def test_failed_write_detaches_the_port(policy, expected):
+    pytest.importorskip('serial')   # The writer tells timeouts apart with the pyserial exceptions
+    unplugged = FakePort(failures=1)
+    writer = engine.SerialWriter(unplugged, offline_policy=policy)
+    writer.start()
+    writer.send(b'a')
+    deadline = time.perf_counter() + 5
+    while writer.port is not None and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    assert writer.port is None and unplugged.closed
+    writer.send(b'b')
+    port = FakePort()
+    writer.attach(port)
+    writer.stop()
+    assert port.written == expected
+    assert writer.errors == 1
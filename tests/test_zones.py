@@ -0,0 +1,62 @@
+# Created and maintained by: Minedient
+# GPL-3.0 License
+
+import types
+
+import numpy as np
+import pytest
+
+import engine
+
+SQUARE = np.array([[0, 0], [10, 0], [10, 10], [0, 10]], dtype=np.float64)
+# An L shape: the square without its top right quarter
+L_SHAPE = np.array([[0, 0], [10, 0], [10, 5], [5, 5], [5, 10], [0, 10]], dtype=np.float64)
+
+class FakeBoxes:
+    """
+    Boxes of a result as the predictor returns them: x1, y1, x2, y2, confidence, class.
+    """
+    def __init__(self, rows):
+        self.data = types.SimpleNamespace(cpu=lambda: types.SimpleNamespace(numpy=lambda: np.array(rows, dtype=np.float32).reshape(-1, 6)))
+        self.count = len(rows)
+
+    def __len__(self):
+        return self.count
+
+def result(*rows):
+    return types.SimpleNamespace(boxes=FakeBoxes(rows))
+
+@pytest.fixture(autouse=True)
+def model(monkeypatch):
+    monkeypatch.setattr(engine, 'model', types.SimpleNamespace(names={0: 'person', 1: 'chair'}))
+
+def test_points_in_square():
+    points = np.array([[5, 5], [15, 5], [-1, 5], [5, 11], [1, 9]], dtype=np.float64)
+    assert engine.points_in_polygon(points, SQUARE).tolist() == [True, False, False, False, True]
+
+def test_points_in_concave_polygon():
+    points = np.array([[2, 2], [7, 2], [2, 7], [7, 7]], dtype=np.float64)
+    assert engine.points_in_polygon(points, L_SHAPE).tolist() == [True, True, True, False]
+
+def test_no_points():
+    assert engine.points_in_polygon(np.empty((0, 2)), SQUARE).shape == (0,)
+
+def test_label_counts_of_each_source():
+    counts = engine.get_label_counts([result([0, 0, 2, 2, 0.9, 0], [0, 0, 2, 2, 0.8, 1]),
+                                      None,
+                                      result([0, 0, 2, 2, 0.9, 0], [4, 4, 6, 6, 0.7, 0])])
+    # Totals, then the counts of the three sources
+    assert counts.tolist() == [3, 1, 1, 1, 0, 0, 2, 0]
+
+def test_label_counts_of_each_zone():
+    zones = [('room', SQUARE), ('corner', L_SHAPE)]
+    # A person at (3, 3) in both zones, a chair at (7, 7) in the room only, a person at (25, 25) in neither
+    counts = engine.get_label_counts([result([2, 2, 4, 4, 0.9, 0], [6, 6, 8, 8, 0.9, 1], [24, 24, 26, 26, 0.9, 0])], zones=zones)
+    # Totals, the single source, then the room and the corner
+    assert counts.tolist() == [2, 1, 2, 1, 1, 1, 1, 0]
+
+def test_label_counts_offset_of_the_cropped_region():
+    zones = [('room', SQUARE)]
+    # The box is centered at (1, 1) in the cropped frame, (21, 21) in the captured frame
+    counts = engine.get_label_counts([result([0, 0, 2, 2, 0.9, 0])], zones=zones, offset=(20, 20))
+    assert counts.tolist() == [1, 0, 1, 0, 0, 0]
@@ -1,233 +1,80 @@
 # Created and maintained by: Minedient
 # GPL-3.0 License
 
-import sys, os, math
+import time
+STARTED = time.perf_counter() # Start of the program, for the time-to-first-window logged once the window shows
+
+import sys, os
 from PySide6.QtWidgets import QMessageBox, QApplication, QMainWindow, QFileDialog
-from PySide6.QtCore import Slot
-from ultralytics import YOLO
+from PySide6.QtCore import Qt, Slot, Signal, QObject, QThread, QTimer
 from gui import Ui_MainDialog
 import logging
-import configparser
 import json
-
-# Serial communication related libraries
-import serial
-import serial.tools.list_ports as list_ports
-# OpenCV related libraries
-import cv2
-
-# Set up configuration parser
-config = configparser.ConfigParser(interpolation=None)  # Ensure no interpolation is done, so % can be used in the text
-
-# Set up logger
-logging.basicConfig(format='%(asctime)s %(message)s', datefmt='%Y-%m-%d %H:%M:%S', level=logging.INFO)
-
-# Disable ultralytics logging
-logging.getLogger('ultralytics').setLevel(logging.ERROR)
-
-# Constants
-PID_MICROBIT = 516
-VID_MICROBIT = 3368
-TIMEOUT = 1.0
-CONDITIONALS = {
-    0: lambda x, y: x > y,
-    1: lambda x, y: x >= y,
-    2: lambda x, y: x == y,
-    3: lambda x, y: x != y,
-    4: lambda x, y: x < y,
-    5: lambda x, y: x <= y
-}
-SETTINGS = {
-    'first_type': ('typeComboBox', 'currentIndex', 'setCurrentIndex', '0'),
-    'second_type': ('typeComboBox_2', 'currentIndex', 'setCurrentIndex', '0'),
-    'first_relation': ('relationComboBox', 'currentIndex', 'setCurrentIndex', '0'),
-    'second_relation': ('relationComboBox_2', 'currentIndex', 'setCurrentIndex', '0'),
-    'first_number': ('numberSpinBox','value', 'setValue', '0'),
-    'second_number': ('numberSpinBox_2','value', 'setValue', '0'),
-    'logic': ('logicComboBox','currentIndex', 'setCurrentIndex', '0'),
-    'command_text': ('lineEdit', 'text', 'setText', ''),
-    'command_text_else': ('lineEdit_2', 'text', 'setText', ''),
-    'has_negate': ('hasNegate', 'isChecked', 'setChecked', 'False')
+import threading
+
+# The detection itself runs in the engine, the window only drives it
+# The engine imports torch, ultralytics and OpenCV lazily, so they do not delay the window
+import engine
+from engine import (config, SETTINGS, CAM_INDEX, LATENCY_STAGES, DetectionEngine, build_rule, get_sources,
+                    camera_name, camera_index, list_available_cameras, format_latency, get_model_key, prepare_model,
+                    blank_config, read_config, read_config_json, write_to_config, replace_and_escape, ensure_ini_type,
+                    get_setting)
+
+# Signal emitted by the widgets in SETTINGS when their value changes, keyed by the getter
+CHANGE_SIGNALS = {
+    'currentIndex': 'currentIndexChanged',
+    'value': 'valueChanged',
+    'text': 'textChanged',
+    'currentText': 'currentTextChanged',
+    'isChecked': 'toggled'
 }
-CAM_INDEX = 0 # Default camera index
 
 # Global variables
-model = None
-end_capture = False
-ser = None
-
-# Function to find the port for the micro:bit
-def find_port(pid, vid, baud):
-    port = serial.Serial(timeout=TIMEOUT)
-    port.baudrate = baud
-    ports = list(list_ports.comports())
-    logging.info("搜尋Micro:bit中...")
-    for p in ports:
-        if (p.pid == pid) and (p.vid == vid):
-            logging.info('找到目標 PID: {} VID: {} Port: {}'.format(
-                p.pid, p.vid, p.device))
-            port.port = str(p.device)
-            return port
-    return None
-
-# Draw the bounding box of the detected object in the captured frame
-def draw_box(frame, box, names):
-    x1, y1, x2, y2 = box.xyxy[0]
-    x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2) # convert to int values
-    confidence = math.ceil((box.conf[0]*100))/100
-    label = names[int(box.cls)]
-    cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 255), 3)
-    y = y1 - 15 if y1 - 15 > 15 else y1 + 15
-    cv2.putText(frame, f"{label}: {confidence:.2f}", (x1, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-# Get the label counts from the results (all)
-def get_label_counts(results, frame):
-    label_counts = {}
-    for result in results:
-        boxes = result.boxes
-        for box in boxes:
-            # if confidence is less than 0.5, ignore the box
-            if box.conf[0] < 0.5:
-                continue
-
-            # Draw bounding boxes
-            draw_box(frame, box, model.names)
-
-            # Get the label name
-            label = model.names[int(box.cls)]
-            if label in label_counts:
-                label_counts[label] += 1
-            else:
-                label_counts[label] = 1
-    return label_counts
-
-# This function process if the logic relation of the two counters with the given relation and number are met
-def counter_logic(type1Counter, type2Counter):
-    r1 = window.ui.relationComboBox.currentIndex()
-    r2 = window.ui.relationComboBox_2.currentIndex()
-    n1 = window.ui.numberSpinBox.value()
-    n2 = window.ui.numberSpinBox_2.value()
-    l = window.ui.logicComboBox.currentIndex()
-
-    #logging.info("Type 1 Counter: {}, Type 2 Counter: {}".format(type1Counter, type2Counter))
-    type1Result = CONDITIONALS.get(r1, lambda x, y: False)(type1Counter, n1)
-
-    #logging.info("Type 1: {}, Relation 1: {}, Number 1: {}, Logic: {}, Type 2: {}, Relation 2: {}, Number 2: {}".format(t1, r1, n1, l, t2, r2, n2))
-    if l == 0:
-        return type1Result
-    else:
-        type2Result = CONDITIONALS.get(r2, lambda x, y: False)(type2Counter, n2)
-        return type1Result or type2Result if l == 1 else type1Result and type2Result
-
-# Find and lsit all available cameras
-def list_available_cameras():
-    index = 0
-    arr = []
-    while True:
-        cap = cv2.VideoCapture(index)
-        if not cap.read()[0]:
-            break
-        else:
-            arr.append(index)
-        cap.release()
-        index += 1
-    return arr
-
-# Replace the placeholders in the command text with counters and send the command to the micro:bit
-def prepare_and_send_command_text(text, type1, type2, color):
-    text = text.replace("%1", str(type1)).replace("%2", str(type2))
-    window.ui.label_7.setText('發送指令：{}'.format(text))
-    window.ui.label_7.setStyleSheet("color: {}".format(color))
-    ser.write(str(text).encode())
-
-# Load the model from the file, and update the label and combobox
-def load_model(model_file):
+model_path = ''
+loaded_model_key = None
+detection_thread = None
+detection_worker = None
+
+# Read the rule from the widgets, only called on the GUI thread when a widget changes
+def compile_rule():
+    engine.rule = build_rule({key: window.ui.__getattribute__(value[0]).__getattribute__(value[1])() for key, value in SETTINGS.items()})
+
+# Select the classes of the two counters
+def set_type_indices(type_indices):
+    window.ui.typeComboBox.setCurrentIndex(type_indices[0])
+    window.ui.typeComboBox_2.setCurrentIndex(type_indices[1])
+
+# Load the model from the file in the background, the label and combobox are updated by on_model_loaded
+def load_model(model_file, type_indices=(0, 0)):
+    if detection_thread is not None and detection_thread.isRunning():
+        logging.error("偵測進行中，請先暫停再更換模型")
+        return
     try:
-        global model
-        logging.info(f"已讀取模型: {model_file}")
-        # Load the model
-        model = YOLO(model_file)
-        logging.info("正在嘗試加載模型……")
-        # Update the label
-        window.ui.modelLabel.setText(f'已加載模型：{os.path.basename(model_file)}')
-
-        # Extract Model Informations
-        names = model.names
-
-        # Clear previous items
-        window.ui.typeComboBox.clear()
-        window.ui.typeComboBox_2.clear()
-
-        # Add the model names to the combobox for selection
-        for name in names.values():
-            window.ui.typeComboBox.addItem(name)
-            window.ui.typeComboBox_2.addItem(name)
-        
-        window.ui.typeComboBox.setCurrentIndex(0)
-        window.ui.typeComboBox_2.setCurrentIndex(0)
-        
-        logging.info("模型標籤已加載到組合框中。")
-    except Exception as e:
+        key = get_model_key(model_file)
+    except OSError as e:
         logging.error(f"加載模型時出錯：{e}")
+        return
 
-# Function to reset the configuration to default
-def blank_config():
-    config['SETTINGS'] = {
-        'yolo_model': '',
-    }
-    for key, value in SETTINGS.items():
-        config['SETTINGS'][key] = value[3]
-
-def read_config():
-    """Read the configuration file"""
-    if not os.path.exists('config.ini'):
-        logging.error("找不到/沒有配置文件！")
-        raise FileNotFoundError("找不到/沒有配置文件！")
-    config.read('config.ini')
-
-def write_to_config():
-    """Write the configuration to the ini file"""
-    with open('config.ini', 'w') as configfile:
-        config.write(configfile)
+    # Reloading the configuration with the model that is already loaded costs nothing
+    if key == loaded_model_key:
+        set_type_indices(type_indices)
+        return
 
-def print_config():
-    """Print the configuration to the console"""
-    for key in config['SETTINGS']:
-        logging.debug(f"{key} = {config['SETTINGS'][key]}")
+    logging.info(f"已讀取模型: {model_file}")
+    logging.info("正在嘗試加載模型……")
+    window.model_loader.start(model_file, key, type_indices)
 
 def apply_config():
     """Apply the configuration to the UI and load the model"""
-    m_file = config['SETTINGS']['yolo_model']
-    load_model(m_file) if m_file != '' else None # Load the model from the configuration file, ignore if there is no model file
-
     # Apply the rest of the configuration to the UI
     for key, value in SETTINGS.items():
-        window.ui.__getattribute__(value[0]).__getattribute__(value[2])(ensure_ini_type(config['SETTINGS'][key]))
-    
+        window.ui.__getattribute__(value[0]).__getattribute__(value[2])(get_setting(key))
 
-### Utility Functions Section Start ###
-def replace_and_escape(value):
-    if isinstance(value, bool):
-        return 'True' if value else 'False'         # Replace boolean values with string
-    elif isinstance(value, (int, float)):
-        return str(value)                           # Convert int and float to string
-    elif isinstance(value, str):
-        if any(c in value for c in ['\n', '\r', '\t', '\f', '\v', '#', ';', ' ', '=', ':']):    # Escape special characters
-            return f'"{value}"'
-        return value
-    else:
-        raise ValueError(f"Unsupported value type: {type(value)}")
-
-def ensure_ini_type(value):
-    try:
-        return int(value)
-    except ValueError:
-        if value == 'True' or value == 'False': # ugly, but works
-            return value == 'True'
-        else:
-            return value
-
-### Utility Functions Section End ###
+    # The classes are selected again once the model is loaded and the combobox is filled
+    type_indices = tuple(ensure_ini_type(config['SETTINGS'].get(key, '0')) for key in ('first_type', 'second_type'))
+    m_file = config['SETTINGS']['yolo_model']
+    load_model(m_file, type_indices) if m_file != '' else None # Load the model from the configuration file, ignore if there is no model file
+    
 
 ### QT Slots Section Start ###
 
@@ -242,9 +89,14 @@ def on_loadModelButton_clicked():
 
 @Slot()
 def start_detection():
-    global model, end_capture, ser
-    if model is None or ser is None:
-        error_message = "請先加載模型！" if model is None else "請先連接到micro:bit！"
+    global detection_thread, detection_worker
+    # A model still loading would replace the model under the running detection
+    loading = window.model_loader.latest != loaded_model_key
+    if engine.model is None or engine.ser is None or loading:
+        if loading:
+            error_message = "模型加載中，請稍候！"
+        else:
+            error_message = "請先加載模型！" if engine.model is None else "請先連接到micro:bit！"
         logging.error(error_message)
         # Show a message box
         msg = QMessageBox()
@@ -253,100 +105,107 @@ def start_detection():
         msg.setWindowTitle("提示")
         msg.exec()
         return
+
+    if detection_thread is not None and detection_thread.isRunning():
+        logging.info("偵測已在進行中")
+        return
     
     logging.info("初始化中……請稍候……")
     
     # Reset the flag
-    end_capture = False
+    engine.end_capture = False
+
+    # Make sure the rule matches the current widgets and the loaded model
+    compile_rule()
+
+    # Run the detection loop in a worker thread, so the UI stays responsive
+    detection_thread = QThread()
+    detection_worker = DetectionWorker(get_sources(camera_index(window.ui.cameraComboBox.currentText())))
+    detection_worker.moveToThread(detection_thread)
+    detection_thread.started.connect(detection_worker.run)
+    detection_worker.finished.connect(detection_thread.quit)
+    # The slots are methods of the window, so Qt queues the reports to the GUI thread
+    detection_worker.status_updated.connect(window.show_status)
+    detection_worker.latency_updated.connect(window.show_latency)
+    detection_worker.command_sent.connect(window.show_command)
+    detection_worker.error.connect(window.show_detection_error)
+    detection_thread.start()
 
-    cap = cv2.VideoCapture(CAM_INDEX)
-    
-    if not cap.isOpened():
-        logging.error("無法打開選擇的攝像頭設備")
+@Slot()
+def on_stopButton_clicked():
+    engine.end_capture = True
+
+@Slot(str, str)
+def on_model_progress(model_file, state):
+    window.ui.modelLabel.setText(f'正在加載模型：{os.path.basename(model_file)}（{state}）')
+
+@Slot(str, object, object)
+def on_model_loaded(model_file, key, loaded):
+    global model_path, loaded_model_key
+    # Ignore the models replaced by a newer load
+    if key != window.model_loader.latest:
         return
-    
-    logging.info("開始收集數據")
-
-    old1, old2 = 0, 0
-
-    while not end_capture:
-        ret, frame = cap.read()
-        if not ret:
-            msg = QMessageBox()
-            msg.setIcon(QMessageBox.Error)
-            msg.setText("讀取幀時出錯！")
-            msg.setWindowTitle("錯誤")
-            msg.exec()
-            logging.error("讀取幀時出錯！")
-            break
-
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = model(rgb_frame)
-
-        label_counts = get_label_counts(results, frame)
-        type1Counter, type2Counter = label_counts.get(window.ui.typeComboBox.currentText(), 0), label_counts.get(window.ui.typeComboBox_2.currentText(), 0)
-
-        if type1Counter != old1 or type2Counter != old2:
-            # Only update if either of the counters have changed
-            if counter_logic(type1Counter, type2Counter):
-                # Send a signal here
-                prepare_and_send_command_text(window.ui.lineEdit.text(), type1Counter, type2Counter, "green")
-                #logging.info("符合條件，將會發送指令：{} 到micro:bit".format(command_text))
-
-                # Send the command to the micro:bit
-            elif window.ui.hasNegate.isChecked():
-                #Get the command of the else condition
-                prepare_and_send_command_text(window.ui.lineEdit_2.text(), type1Counter, type2Counter, "red")
-                #logging.info("符合else條件，將會發送指令：{} 到micro:bit".format(command_text))
-            old1, old2 = type1Counter, type2Counter
-
-
-        cv2.imshow('Video captured using {}'.format(model.model_name), frame)
-    
-        # Break the loop on 'q' key press
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-    
-    logging.info("停止收集數據")
+    engine.model, engine.inference_args, type_indices = loaded
+    model_path, loaded_model_key = model_file, key
+
+    # Update the label
+    window.ui.modelLabel.setText(f'已加載模型：{os.path.basename(model_file)}')
+
+    # Extract Model Informations
+    names = engine.model.names
+
+    # Clear previous items
+    window.ui.typeComboBox.clear()
+    window.ui.typeComboBox_2.clear()
 
-    ser.write('0'.encode())
+    # Add the model names to the combobox for selection
+    for name in names.values():
+        window.ui.typeComboBox.addItem(name)
+        window.ui.typeComboBox_2.addItem(name)
 
-    # Release the capture and close windows
-    cap.release()
-    cv2.destroyAllWindows()   
+    set_type_indices(type_indices)
+
+    logging.info("模型標籤已加載到組合框中。")
+
+@Slot(str, object, str)
+def on_model_failed(model_file, key, error_message):
+    # The model in use stays loaded
+    if key == window.model_loader.latest:
+        window.model_loader.latest = loaded_model_key
+    logging.error(f"加載模型時出錯：{error_message}")
+    window.ui.modelLabel.setText(f'已加載模型：{os.path.basename(model_path)}' if engine.model is not None else '未選擇模型')
 
 @Slot()
-def on_stopButton_clicked():
-    global end_capture
-    end_capture = True
+def on_refreshCameraButton_clicked():
+    logging.info("正在搜尋攝像頭……")
+    window.camera_discovery.start(refresh=True)
+
+@Slot(list)
+def on_cameras_found(cameras):
+    # Keep the selection, or fall back to the camera saved in the configuration file
+    selected = window.ui.cameraComboBox.currentText() or config.get('SETTINGS', 'camera', fallback=camera_name(CAM_INDEX))
+    window.ui.cameraComboBox.clear()
+    for index in cameras:
+        window.ui.cameraComboBox.addItem(camera_name(index))
+    window.ui.cameraComboBox.setCurrentText(selected)
+    logging.info("找到 {} 個攝像頭".format(len(cameras)))
 
 @Slot()
 def on_connectButton_clicked():
-    global ser
-    ser = find_port(PID_MICROBIT, VID_MICROBIT, 115200)
-    if ser is None:
-        logging.error("無法找到目標設備，請確保micro:bit已連接到電腦或試一個新的micro:bit。")
-        return
-    else:
-        # Terminate the connection and re-enstablish it
-        logging.info("正在重新連接到目標設備……")
-        ser.close()
-    ser.open()
-    ser.write('0'.encode())
-    logging.info("已連接到目標設備")
+    engine.connect_microbit()
 
 @Slot()
 def on_manualButton_clicked():
-    if ser is None:
+    if engine.ser is None:
         logging.error("請先把電腦連接到micro:bit！")
         return
     command_text = window.ui.lineEdit.text()
-    ser.write(str(command_text).encode())
+    engine.serial_writer.send(str(command_text).encode())
     logging.info("已發送手動指令：{}".format(command_text))
 
 @Slot()
 def on_saveButton_clicked():
-    config['SETTINGS']['yolo_model'] = window.ui.modelLabel.text().split('：')[1]
+    config['SETTINGS']['yolo_model'] = os.path.basename(model_path)
     for key, value in SETTINGS.items():
         config['SETTINGS'][key] = replace_and_escape(window.ui.__getattribute__(value[0]).__getattribute__(value[1])())
     # Save the configuration to the file
@@ -361,11 +220,18 @@ def on_reloadButton_clicked():
 @Slot()
 def on_resetButton_clicked():
     # Reset all  to default
-    global model, ser
+    global model_path, loaded_model_key
+    # The detection worker uses the model and the connection until it stops
+    if detection_thread is not None and detection_thread.isRunning():
+        logging.error("偵測進行中，請先暫停再重置")
+        return
     logging.info("卸載模型中……")
-    model = None
+    engine.model = None
+    model_path = ''
+    loaded_model_key = None
+    window.model_loader.latest = None # Drop the model still loading, if any
     logging.info("關閉與micro:bit的連接……(如有)")
-    ser = None
+    engine.disconnect_microbit()
     window.ui.modelLabel.setText('未選擇模型')
 
     # Clear the combobox
@@ -399,21 +265,96 @@ def on_exportButton_clicked():
 
 ### QT Slots Section End ###
 
+### QT Worker Section Start ###
+
+class ModelLoader(QObject):
+    """
+    Loads the models in a background thread, so the window never freezes while a model loads.
+
+    The state of the loading is reported through `progress`; when several loads overlap,
+    only the result of the latest one is used.
+    """
+    progress = Signal(str, str)         # model file, state
+    loaded = Signal(str, object, object) # model file, cache key, (model, inference arguments, type indices)
+    failed = Signal(str, object, str)   # model file, cache key, error message
+
+    def __init__(self):
+        super(ModelLoader, self).__init__()
+        self.latest = None
+
+    def start(self, model_file, key, type_indices):
+        self.latest = key
+        threading.Thread(target=self.load, args=(model_file, key, type_indices), daemon=True).start()
+
+    def load(self, model_file, key, type_indices):
+        try:
+            loaded, args = prepare_model(model_file, key, lambda state: self.progress.emit(model_file, state))
+        except Exception as e:
+            self.failed.emit(model_file, key, str(e))
+            return
+        self.loaded.emit(model_file, key, (loaded, args, type_indices))
+
+class CameraDiscovery(QObject):
+    """
+    Runs list_available_cameras in a background thread and reports the cameras through a signal.
+    """
+    found = Signal(list)
+
+    def start(self, refresh=False):
+        threading.Thread(target=lambda: self.found.emit(list_available_cameras(refresh)), daemon=True).start()
+
+class DetectionWorker(QObject):
+    """
+    Worker that runs the detection engine off the GUI thread.
+
+    The worker is moved to a QThread and forwards the reports of the engine as signals,
+    which Qt delivers to the slots of the window on the GUI thread as queued connections.
+    """
+    status_updated = Signal(int, int, float)    # type 1 count, type 2 count, FPS
+    latency_updated = Signal(object)            # stage -> (p50, p95, p99) in seconds, every STATUS_INTERVAL seconds
+    command_sent = Signal(str, str)             # command text, label color, at most every LABEL_INTERVAL seconds
+    error = Signal(str)
+    finished = Signal()
+
+    def __init__(self, sources=(CAM_INDEX,)):
+        super(DetectionWorker, self).__init__()
+        self.engine = DetectionEngine(sources, self.status_updated.emit, self.command_sent.emit,
+                                      self.latency_updated.emit, self.error.emit)
+
+    @Slot()
+    def run(self):
+        try:
+            self.engine.detect()
+        finally:
+            self.finished.emit()
+
+### QT Worker Section End ###
+
 ### QT Window Section Start ###
 
+class LogSignal(QObject):
+    """
+    Carrier of the formatted log messages, so records logged from worker threads reach the GUI thread.
+    """
+    message = Signal(str)
+
 class TextBrowserLogger(logging.Handler):
     """
     A simple logger Handler that bound to a QTextBrowser widget.
+
+    Messages are forwarded through a signal, so it is safe to log from any thread.
     """
     def __init__(self, textBrowser):
         super(TextBrowserLogger, self).__init__()
         self.textBrowser = textBrowser
+        self.signal = LogSignal()
+        self.signal.message.connect(self.textBrowser.append)
 
     def format(self, record):
         return f"{record.asctime} {record.getMessage()}"
 
     def emit(self, record):
-        self.textBrowser.append(self.format(record))
+        self.signal.message.emit(self.format(record))
 
     
 class MainWindow(QMainWindow):
@@ -429,6 +370,8 @@ class MainWindow(QMainWindow):
         self.ui = Ui_MainDialog()
         self.ui.setupUi(self)
         self.setAcceptDrops(True)
+        self.last_command = ''
+        self.last_color = ''
 
         # Add a logger to the text browser
         logger = TextBrowserLogger(self.ui.runtimeLogger)
@@ -445,10 +388,65 @@ class MainWindow(QMainWindow):
         self.ui.reloadButton.clicked.connect(on_reloadButton_clicked)
         self.ui.resetButton.clicked.connect(on_resetButton_clicked)
         self.ui.exportButton.clicked.connect(on_exportButton_clicked)
+        self.ui.refreshCameraButton.clicked.connect(on_refreshCameraButton_clicked)
+
+        # Load the models in the background
+        self.model_loader = ModelLoader()
+        self.model_loader.progress.connect(on_model_progress, Qt.QueuedConnection)
+        self.model_loader.loaded.connect(on_model_loaded, Qt.QueuedConnection)
+        self.model_loader.failed.connect(on_model_failed, Qt.QueuedConnection)
+
+        # Look for the cameras in the background, the picker is filled when they are found
+        self.camera_discovery = CameraDiscovery()
+        self.camera_discovery.found.connect(on_cameras_found, Qt.QueuedConnection)
+        self.camera_discovery.start()
 
         # Detect enter key press in the line edit
         self.ui.lineEdit.returnPressed.connect(on_manualButton_clicked)
 
+        # Recompile the rule whenever one of its widgets changes
+        for value in SETTINGS.values():
+            signal = self.ui.__getattribute__(value[0]).__getattribute__(CHANGE_SIGNALS[value[1]])
+            signal.connect(lambda *args: compile_rule())
+
+    def closeEvent(self, event):
+        # Stop the detection worker before the window (and its thread) is destroyed
+        if detection_thread is not None and detection_thread.isRunning():
+            engine.end_capture = True
+            detection_thread.wait()
+        event.accept()
+
+    # Reports of the detection worker, see start_detection
+    @Slot(str, str)
+    def show_command(self, text, color):
+        self.last_command = text
+        self.ui.label_7.setText('發送指令：{}'.format(text))
+        # Only rebuild the stylesheet when the color changes
+        if color != self.last_color:
+            self.last_color = color
+            self.ui.label_7.setStyleSheet("color: {}".format(color))
+
+    @Slot(int, int, float)
+    def show_status(self, type1, type2, fps):
+        self.ui.label_7.setText('發送指令：{} ({}, {}) {:.1f} FPS'.format(self.last_command, type1, type2, fps))
+
+    @Slot(object)
+    def show_latency(self, summary):
+        # The label shows the end-to-end latency, the tooltip every stage
+        stage = 'end_to_end' if 'end_to_end' in summary else 'inference'
+        if stage in summary:
+            p50, p95, _ = summary[stage]
+            self.ui.statsLabel.setText('{}：{:.0f}/{:.0f}ms'.format(LATENCY_STAGES[stage], p50 * 1000, p95 * 1000))
+        self.ui.statsLabel.setToolTip('\n'.join(format_latency(summary)))
+
+    @Slot(str)
+    def show_detection_error(self, error_message):
+        msg = QMessageBox()
+        msg.setIcon(QMessageBox.Error)
+        msg.setText(error_message)
+        msg.setWindowTitle("錯誤")
+        msg.exec()
+
     def dragEnterEvent(self, event):
         if event.mimeData().hasUrls():
             event.acceptProposedAction()
@@ -462,13 +460,10 @@ class MainWindow(QMainWindow):
                 logging.error("只能導入JSON文件！")
                 return
             
-            with open(file_path, 'r') as f:
-                json_data = json.load(f)
-                for key in json_data['SETTINGS']:
-                    config['SETTINGS'][key] = json_data['SETTINGS'][key]
-                apply_config()
-                write_to_config()
-                logging.info("已導入配置文件：{}".format(file_path))
+            read_config_json(file_path)
+            apply_config()
+            write_to_config()
+            logging.info("已導入配置文件：{}".format(file_path))
 
             event.acceptProposedAction()
         else:
@@ -507,10 +502,12 @@ if __name__ == "__main__":
 
     window = MainWindow()
 
-    preload()   # Load the configuration file
-
-    # Show the window
+    # Show the window first, the configuration and the heavy libraries are loaded afterwards
     window.show()
+    QTimer.singleShot(0, lambda: logging.info("視窗已顯示，啟動耗時 {:.2f} 秒".format(time.perf_counter() - STARTED)))
+    threading.Thread(target=engine.import_libraries, daemon=True).start()
+
+    preload()   # Load the configuration file
 
     logging.info("歡迎使用物品偵測模型與micro:bit連結器！")
     logging.info("請先加載模型，然後點擊開始按鈕開始偵測。")
@@ -518,6 +515,6 @@ if __name__ == "__main__":
     logging.info("您可以在下方設置條件，當條件符合時，將會發送指令到micro:bit。")
     logging.info("請在micro:bit上加載對應的程式，方能正確解析指令。")
 
-    postload() # Load the model and apply the configuration
+    postload() # Apply the configuration, the model loads in the background
 
     sys.exit(app.exec())
\ No newline at end of file